@@ -6,6 +6,12 @@ export interface ChatSession {
   tokenLimitReached?: boolean;
 }
 
+export interface ChatListResponse {
+  sessionId: string;
+  chats: ChatSession[];
+  nextCursor?: string | null;
+}
+
 export interface HealthCheckResponse {
   status: string;
   timestamp: string;
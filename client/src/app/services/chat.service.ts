@@ -11,7 +11,11 @@ import {
 } from 'rxjs';
 import { HttpClient, HttpErrorResponse } from '@angular/common/http';
 import { environment } from '../../environments/environment';
-import { ChatSession, HealthCheckResponse } from '../interfaces/chat-session';
+import {
+  ChatListResponse,
+  ChatSession,
+  HealthCheckResponse,
+} from '../interfaces/chat-session';
 
 @Injectable({
   providedIn: 'root',
@@ -592,6 +596,30 @@ export class ChatService {
     }));
   }
 
+  // El servidor devuelve los chats por páginas: se siguen los nextCursor hasta la última
+  private async fetchSessionChats(sessionId: string): Promise<{
+    sessionId: string;
+    chats: ChatSession[];
+  }> {
+    let chats: ChatSession[] = [];
+    let cursor: string | null = null;
+    let response: ChatListResponse;
+
+    do {
+      const params: { [param: string]: string } = cursor ? { cursor } : {};
+      response = await firstValueFrom(
+        this.http.get<ChatListResponse>(
+          `${this.apiUrl}/sessions/${sessionId}/chats`,
+          { params }
+        )
+      );
+      chats = chats.concat(response.chats);
+      cursor = response.nextCursor ?? null;
+    } while (cursor);
+
+    return { sessionId: response.sessionId, chats };
+  }
+
   async initializeSession(): Promise<{
     sessionId: string;
     chats: ChatSession[];
@@ -612,11 +640,7 @@ export class ChatService {
 
       if (savedSessionId) {
         // Get existing session's chats
-        response = await firstValueFrom(
-          this.http.get<{ sessionId: string; chats: ChatSession[] }>(
-            `${this.apiUrl}/sessions/${savedSessionId}/chats`
-          )
-        );
+        response = await this.fetchSessionChats(savedSessionId);
       } else {
         // Create new session if we don't have one
         response = await firstValueFrom(
@@ -1,6 +1,6 @@
 from typing import Optional
 from langgraph.graph import MessagesState
-from langchain.schema import AIMessage
+from langchain_core.messages import AIMessage
 
 from .prompts import BASE_PROMPT
 from .models import BuyingInfo, DeviceInfo
@@ -11,6 +11,12 @@ class State(MessagesState):
     device_info: DeviceInfo = DeviceInfo()
     buying_info: Optional[BuyingInfo] = None
     system_prompt_content: str = ""
+    # Número de mensajes ya analizados por cada extracción
+    device_info_until: int = 0
+    buying_info_until: int = 0
+    # Resumen de los turnos antiguos y posición del primer mensaje que no incluye
+    conversation_summary: str = ""
+    summary_until: int = 0
 
     
 def initialize_state():
@@ -32,4 +38,8 @@ Soy tu asistente especializado en la compra-venta de smartphones reacondicionado
         "device_info": DeviceInfo(),
         "buying_info": BuyingInfo(),
         "system_prompt_content": BASE_PROMPT,
+        "device_info_until": 0,
+        "buying_info_until": 0,
+        "conversation_summary": "",
+        "summary_until": 0,
     }
\ No newline at end of file
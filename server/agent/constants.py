@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Marcas soportadas
@@ -21,6 +22,27 @@ GRADE_MAPPING = {
     'E': 1
 }
 
+# Opciones evaluadas al recomendar dispositivos
+STORAGE_OPTIONS = ["64GB", "128GB", "256GB", "512GB", "1TB"]
+GRADE_OPTIONS = ["B", "C", "D", "E"]
+
+# Márgenes de precio de venta por marca y grado
+MARKUP_BY_BRAND = {
+    "apple": {"B": 0.60, "C": 0.55, "D": 0.50, "E": 0.45},  # Apple tiene márgenes más altos
+    "samsung": {"B": 0.55, "C": 0.50, "D": 0.45, "E": 0.40},
+    "xiaomi": {"B": 0.45, "C": 0.40, "D": 0.35, "E": 0.30},
+    "default": {"B": 0.50, "C": 0.45, "D": 0.40, "E": 0.35}  # Para otras marcas
+}
+
+# Confianza mínima del clasificador por reglas para decidir la intención sin llamar al LLM
+INTENT_RULE_THRESHOLD = float(os.getenv("INTENT_RULE_THRESHOLD", "0.75"))
+
+# Ventana de contexto enviada al LLM: tokens máximos y turnos recientes que se envían completos
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "6"))
+# Turnos antiguos que se acumulan antes de resumirlos de una vez
+CONTEXT_SUMMARY_BATCH = int(os.getenv("CONTEXT_SUMMARY_BATCH", "4"))
+
 # Paths
 BASE_DIR = Path(__file__).parent
 MODELS_DIR = BASE_DIR / "models"
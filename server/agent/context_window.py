@@ -0,0 +1,140 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from .constants import CONTEXT_KEEP_TURNS, CONTEXT_SUMMARY_BATCH, CONTEXT_TOKEN_BUDGET
+from .prompts import CONVERSATION_SUMMARY_CONTEXT, CONVERSATION_SUMMARY_PROMPT
+
+# Tokens extra que añade el formato de chat de OpenAI a cada mensaje
+TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4")
+    except Exception as e:
+        # Sin tiktoken (o sin poder descargar la codificación) se estima por caracteres
+        print(f"tiktoken not available, estimating tokens by length: {e}")
+        return None
+
+
+def count_text_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def count_tokens(messages: List[BaseMessage]) -> int:
+    """Tokens aproximados que ocupan los mensajes en la petición al LLM."""
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += count_text_tokens(content) + TOKENS_PER_MESSAGE
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            total += count_text_tokens(str(tool_calls))
+    return total
+
+
+def turn_starts(messages: List[BaseMessage], start: int = 0) -> List[int]:
+    """Posiciones donde empieza cada turno (cada mensaje del usuario) a partir de start.
+
+    Cortar solo al inicio de un turno mantiene juntas las llamadas a
+    herramientas y sus resultados.
+    """
+    return [i for i in range(start, len(messages)) if isinstance(messages[i], HumanMessage)]
+
+
+def format_messages(messages: List[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"Usuario: {message.content}")
+        elif message.type == "ai" and message.content:
+            lines.append(f"Asistente: {message.content}")
+    return "\n".join(lines)
+
+
+def _with_summary(state, system_content: str) -> List[BaseMessage]:
+    summary = state.get("conversation_summary")
+    if summary:
+        system_content += CONVERSATION_SUMMARY_CONTEXT.format(summary=summary)
+    return [SystemMessage(content=system_content)] if system_content else []
+
+
+def window_start(state, system_content: str = "", budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[int, int]:
+    """Primer mensaje de la ventana que cabe en el presupuesto y los tokens estimados.
+
+    La ventana empieza en summary_until y, mientras no quepa, se adelanta al
+    siguiente turno, conservando siempre el turno actual.
+    """
+    messages = state["messages"]
+    start = state.get("summary_until") or 0
+    used = count_tokens(_with_summary(state, system_content))
+    tokens = used + count_tokens(messages[start:])
+
+    candidates = [turn for turn in turn_starts(messages, start) if turn > start]
+    while tokens > budget and candidates:
+        start = candidates.pop(0)
+        tokens = used + count_tokens(messages[start:])
+    return start, tokens
+
+
+def fold_old_turns(state, llm, system_content: str = "", budget: int = CONTEXT_TOKEN_BUDGET) -> bool:
+    """Resume los turnos que han quedado fuera de la ventana.
+
+    Se espera a que haya CONTEXT_SUMMARY_BATCH turnos pendientes para hacer
+    una sola llamada al LLM cada varios turnos, salvo que los turnos sin
+    resumir no quepan en el presupuesto: entonces se resumen los que no caben
+    para que build_context no los descarte. El resumen y la posición del
+    primer mensaje sin resumir se guardan en el estado. Devuelve True si se
+    ha actualizado el resumen.
+    """
+    messages = state["messages"]
+    summary_until = state.get("summary_until") or 0
+    starts = turn_starts(messages, summary_until)
+    new_until = summary_until
+    if len(starts) > CONTEXT_KEEP_TURNS + CONTEXT_SUMMARY_BATCH:
+        new_until = starts[-CONTEXT_KEEP_TURNS]
+    new_until = max(new_until, window_start(state, system_content, budget)[0])
+    if new_until <= summary_until:
+        return False
+
+    prompt = CONVERSATION_SUMMARY_PROMPT.format(
+        summary=state.get("conversation_summary") or "(sin resumen previo)",
+        messages=format_messages(messages[summary_until:new_until])
+    )
+    try:
+        response = llm.invoke([SystemMessage(content=prompt)])
+    except Exception as e:
+        # Si falla se reintenta en el siguiente turno; la ventana sigue acotada
+        print(f"Error summarizing conversation: {e}")
+        return False
+
+    state["conversation_summary"] = response.content.strip()
+    state["summary_until"] = new_until
+    print(f"Summarized messages {summary_until}-{new_until} into the conversation summary")
+    return True
+
+
+def build_context(
+    state,
+    system_content: str = "",
+    budget: int = CONTEXT_TOKEN_BUDGET,
+) -> Tuple[List[BaseMessage], int]:
+    """Mensajes a enviar al LLM: prompt de sistema con el resumen y los turnos aún sin resumir.
+
+    Como los turnos se resumen por lotes, se envían entre CONTEXT_KEEP_TURNS y
+    CONTEXT_KEEP_TURNS + CONTEXT_SUMMARY_BATCH turnos completos. fold_old_turns
+    ya resume los que no caben en el presupuesto; si el resumen ha fallado, se
+    descartan los más antiguos, conservando siempre el turno actual. Devuelve
+    los mensajes y los tokens estimados.
+    """
+    start, tokens = window_start(state, system_content, budget)
+    if start > (state.get("summary_until") or 0):
+        print(f"Dropping unsummarized messages before {start} to fit the context budget")
+    return _with_summary(state, system_content) + state["messages"][start:], tokens
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+# Fichero SQLite del segundo nivel; vacío para usar solo la caché en memoria
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# Ids de mensajes y de llamadas a herramientas, distintos en cada ejecución
+_ID_KEYS = ("id", "tool_call_id")
+# Metadatos de las respuestas anteriores (tokens, modelo...) que no se envían al modelo
+_METADATA_KEYS = ("response_metadata", "usage_metadata")
+
+
+def _without_ids(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _without_ids(item) for key, item in value.items()
+            if key not in _METADATA_KEYS and (key not in _ID_KEYS or not isinstance(item, str))
+        }
+    if isinstance(value, list):
+        return [_without_ids(item) for item in value]
+    return value
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normaliza el prompt para que variaciones triviales compartan entrada.
+
+    Se quitan los ids de los mensajes y de las llamadas a herramientas, los
+    metadatos de las respuestas y los espacios repetidos; las mayúsculas se
+    respetan porque pueden cambiar la respuesta.
+    """
+    try:
+        prompt = json.dumps(_without_ids(json.loads(prompt)), ensure_ascii=False, sort_keys=True)
+    except ValueError:
+        pass
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def _renew_tool_call_ids(message: Any) -> None:
+    """Da ids nuevos a las llamadas a herramientas de un mensaje cacheado.
+
+    Cada ToolMessage responde a un tool_call_id; si una respuesta cacheada se
+    repitiera en el mismo chat, dos llamadas compartirían id.
+    """
+    renamed = {}
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        new_id = f"call_{uuid.uuid4().hex[:24]}"
+        renamed[tool_call["id"]] = new_id
+        tool_call["id"] = new_id
+    # Formato de OpenAI que se reenvía al modelo en el siguiente turno
+    for tool_call in message.additional_kwargs.get("tool_calls", []):
+        tool_call["id"] = renamed.get(tool_call["id"], tool_call["id"])
+
+
+def _copy(generations: Sequence[Generation]) -> list:
+    """Copia las generaciones sin el id del mensaje.
+
+    LangChain asigna el id de la ejecución antes de guardar en caché; si se
+    devolviera tal cual, dos respuestas cacheadas en el mismo chat tendrían el
+    mismo id y el grafo reemplazaría una por otra en lugar de añadirla. Por lo
+    mismo se renuevan los ids de las llamadas a herramientas.
+    """
+    copies = []
+    for generation in generations:
+        generation = generation.model_copy(deep=True)
+        message = getattr(generation, "message", None)
+        if message is not None:
+            message.id = None
+            _renew_tool_call_ids(message)
+        copies.append(generation)
+    return copies
+
+
+class LLMCache(BaseCache):
+    """Caché de respuestas del LLM con un nivel LRU en memoria y otro en SQLite.
+
+    La clave es un hash del llm_string (modelo, temperatura, herramientas...)
+    y del prompt normalizado. Las entradas caducan tras ttl_seconds.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: int = 86400, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._lock = threading.Lock()
+        # clave -> (instante de caducidad, generaciones)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(
+            f"{llm_string}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, expires_at: float, value: Sequence[Generation]) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return _copy(entry[1])
+                del self._memory[key]
+                self.expired += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row[1] >= now:
+                        value = loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.disk_hits += 1
+                        return _copy(value)
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.expired += 1
+
+            self.misses += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self.make_key(prompt, llm_string)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, _copy(return_val))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, dumps(list(return_val)), expires_at))
+                self._db.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._memory),
+            "maxsize": self.maxsize,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Caché compartida por los nodos con cache en MODEL_ROUTES (None si está desactivada)
+LLM_CACHE = LLMCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_PATH or None) if LLM_CACHE_ENABLED else None
@@ -1,73 +1,165 @@
-from langchain_openai import ChatOpenAI
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Optional
 from langgraph.graph import START, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 from dotenv import load_dotenv
-from langchain.schema import SystemMessage
 
-from .utils import build_prompt, detect_intent_with_context, extract_buying_info, extract_selling_info, intent_change_potential, verify_intent_change
+from .utils import FORCE_CHECK_KEYWORDS, INTENT_STATS, build_prompt, classify_intent_rules, detect_intent_with_context, extract_buying_info, extract_selling_info, intent_change_potential, verify_intent_change
 from .tools import generate_graphic_dict, get_release_date, get_today_date, predict_price, recommend_device
 from .agent_state import State
+from .constants import INTENT_RULE_THRESHOLD
+from .context_window import build_context, fold_old_turns
+from .model_routing import get_llm
 
 load_dotenv()
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4", temperature=0)
-
 # Define tools como funciones en lugar de diccionarios
 tools = [predict_price, recommend_device, get_today_date, generate_graphic_dict, get_release_date]
-llm_with_tools = llm.bind_tools(tools)
-
 
-def intent_checker(state: State) -> State:
-    """Node that checks and updates the intent if needed."""
+# Un LLM por nodo según MODEL_ROUTES (agent/model_routing.py)
+intent_llm = get_llm("intent_checker")
+extraction_llm = get_llm("info_extractor")
+summary_llm = get_llm("summarizer")
+llm_with_tools = get_llm("assistant", tools=tools)
+
+# Ejecutar la detección de intención y la extracción de información a la vez
+PARALLEL_EXTRACTION = os.getenv("AGENT_PARALLEL_EXTRACTION", "true").lower() in ("1", "true", "yes")
+# Extracción de información por intención: (clave del state, extractor)
+EXTRACTORS = {
+    "sell": ("device_info", extract_selling_info),
+    "graphic": ("device_info", extract_selling_info),
+    "buy": ("buying_info", extract_buying_info),
+}
+speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-extraction")
+
+
+def resolve_intent(state: State) -> Optional[str]:
+    """Returns the intent for the current turn without modifying the state."""
     
     # Parámetros configurables
     VERIFY_EVERY_N_MESSAGES = 3
-    FORCE_CHECK_ON_NEW_TOPIC_KEYWORDS = ["ahora", "entonces", "por otro lado", "cambiando de tema"]
+    
+    current_intent = state.get("intent")
     
     # Determinar si debemos verificar la intención
     messages_count = len(state["messages"])
     last_message = state["messages"][-1].content.lower() if state["messages"] else ""
     
     should_check_intent = (
-        not state.get("intent") or  # Sin intención previa
+        not current_intent or  # Sin intención previa
         intent_change_potential(state) or  # Posible cambio detectado por reglas
         messages_count % VERIFY_EVERY_N_MESSAGES == 0 or  # Verificación periódica
-        any(keyword in last_message for keyword in FORCE_CHECK_ON_NEW_TOPIC_KEYWORDS)  # Palabras clave de cambio de tema
+        any(keyword in last_message for keyword in FORCE_CHECK_KEYWORDS)  # Palabras clave de cambio de tema
     )
     
-    if should_check_intent:
-        # Obtener contexto reciente para el prompt
-        context_messages = state["messages"][-3:] if len(state["messages"]) >= 3 else state["messages"]
-        context = "\n".join([f"{'Usuario' if msg.type == 'human' else 'Asistente'}: {msg.content}" 
-                           for msg in context_messages[:-1]])
-        
-        # Detectar intención con contexto
-        new_intent = detect_intent_with_context(state, llm, context)
-        
-        if not state.get("intent"):
-            state["intent"] = new_intent
-            print(f"Initial intent set to: {new_intent}")
-        elif new_intent != state["intent"]:
-            # Cambio de intención detectado, verificar si debemos actualizar
-            confidence = verify_intent_change(state, new_intent, llm)
-            if confidence > 0.7:  # Umbral configurable
-                print(f"Intent changed from {state['intent']} to {new_intent} (confidence: {confidence})")
-                state["intent"] = new_intent
-            else:
-                print(f"Potential intent change to {new_intent} rejected (confidence: {confidence})")
+    if not should_check_intent:
+        return current_intent
+    
+    # Intentar decidir con reglas antes de recurrir al LLM
+    rule_intent, rule_confidence = classify_intent_rules(state)
+    if rule_intent and rule_confidence >= INTENT_RULE_THRESHOLD:
+        INTENT_STATS["rule_decisions"] += 1
+        # Se evita la detección y, si la intención cambia, también la verificación
+        changed = bool(current_intent) and rule_intent != current_intent
+        INTENT_STATS["llm_calls_avoided"] += 2 if changed else 1
+        print(f"Intent resolved by rules: {rule_intent} (confidence: {rule_confidence:.2f})")
+        return rule_intent
+    
+    INTENT_STATS["llm_decisions"] += 1
+    
+    # Obtener contexto reciente para el prompt
+    context_messages = state["messages"][-3:] if len(state["messages"]) >= 3 else state["messages"]
+    context = "\n".join([f"{'Usuario' if msg.type == 'human' else 'Asistente'}: {msg.content}" 
+                       for msg in context_messages[:-1]])
+    
+    # Detectar intención con contexto
+    new_intent = detect_intent_with_context(state, intent_llm, context)
+    INTENT_STATS["llm_calls"] += 1
+    
+    if not current_intent:
+        print(f"Initial intent set to: {new_intent}")
+        return new_intent
+    
+    if new_intent != current_intent:
+        # Cambio de intención detectado, verificar si debemos actualizar
+        confidence = verify_intent_change(state, new_intent, intent_llm)
+        INTENT_STATS["llm_calls"] += 1
+        if confidence > 0.7:  # Umbral configurable
+            print(f"Intent changed from {current_intent} to {new_intent} (confidence: {confidence})")
+            return new_intent
+        print(f"Potential intent change to {new_intent} rejected (confidence: {confidence})")
+    
+    return current_intent
+
+
+def extract_info(state: State, intent: Optional[str]) -> dict:
+    """Extracts the information relevant to the given intent and returns the state updates.
+    
+    Only the messages added since the previous extraction are sent to the LLM,
+    so corrections in later turns overwrite the stored values.
+    """
+    
+    if intent not in EXTRACTORS:
+        return {}
+    
+    info_key, extractor = EXTRACTORS[intent]
+    cursor_key = f"{info_key}_until"
+    new_messages = state["messages"][state.get(cursor_key) or 0:]
+    updates = {cursor_key: len(state["messages"])}
+    
+    # Sin mensajes nuevos del usuario no hay información nueva que extraer
+    if not any(msg.type == "human" for msg in new_messages):
+        return updates
+    
+    updates[info_key] = extractor(state, extraction_llm, new_messages)
+    return updates
+
+
+def intent_checker(state: State) -> State:
+    """Node that checks and updates the intent if needed."""
     
+    state["intent"] = resolve_intent(state)
     return state
 
 
 def info_extractor(state: State) -> State:
     """Node that extracts relevant information based on intent."""
     
-    if state["intent"] == "sell" or state["intent"] == "graphic":
-        state["device_info"] = extract_selling_info(state, llm)
-    elif state["intent"] == "buy":
-        state["buying_info"] = extract_buying_info(state, llm)
-            
+    state.update(extract_info(state, state["intent"]))
+    return state
+
+
+def intent_and_info(state: State) -> State:
+    """Node that runs intent detection and the extraction for the current intent concurrently.
+    
+    The extraction is speculative: it is kept if the new intent uses the same
+    extractor (sell and graphic share one), otherwise it is discarded and
+    repeated for the new intent.
+    """
+    
+    current_intent = state.get("intent")
+    if current_intent not in EXTRACTORS:
+        # Sin intención previa no hay nada que adelantar
+        state["intent"] = resolve_intent(state)
+        state.update(extract_info(state, state["intent"]))
+        return state
+    
+    # copy_context mantiene los callbacks de LangChain (trazas, streaming) en el otro hilo
+    speculative = speculation_pool.submit(copy_context().run, extract_info, state, current_intent)
+    new_intent = resolve_intent(state)
+    
+    # Se compara el extractor y no la intención: sell y graphic extraen lo mismo
+    if new_intent in EXTRACTORS and EXTRACTORS[new_intent] == EXTRACTORS[current_intent]:
+        updates = speculative.result()
+    else:
+        print(f"Discarding speculative extraction for {current_intent}")
+        speculative.cancel()
+        updates = extract_info(state, new_intent)
+    
+    state["intent"] = new_intent
+    state.update(updates)
     return state
 
 
@@ -79,6 +171,9 @@ def prompt_builder(state: State) -> State:
     
     # Store system message in a safe way (as a string content)
     state["system_prompt_content"] = system_msg.content if system_msg else ""
+
+    # Resumir los turnos que ya no entran en la ventana de contexto o en el presupuesto
+    fold_old_turns(state, summary_llm, state["system_prompt_content"])
     
     return state
 
@@ -89,14 +184,12 @@ def assistant(state: State) -> State:
     # Get system message content built in previous node
     system_content = state.get("system_prompt_content", "")
     
-    # Create a proper SystemMessage
-    system_msg = SystemMessage(content=system_content) if system_content else None
+    # Prompt de sistema con el resumen y los últimos turnos, dentro del presupuesto de tokens
+    context, context_tokens = build_context(state, system_content)
+    print(f"Assistant context: {len(context)} messages, ~{context_tokens} tokens")
     
     # Invoke LLM with tools
-    if system_msg:
-        response = llm_with_tools.invoke([system_msg] + state["messages"])
-    else:
-        response = llm_with_tools.invoke(state["messages"])
+    response = llm_with_tools.invoke(context)
     
     if response.content == '':
         response.content = "Lo siento, no he entendido tu consulta. ¿Podrías reformularla?"
@@ -107,26 +200,35 @@ def assistant(state: State) -> State:
     return state
 
 
-# Build graph
-builder = StateGraph(State)
-
-# Define nodes
-builder.add_node("intent_checker", intent_checker)
-builder.add_node("info_extractor", info_extractor)
-builder.add_node("prompt_builder", prompt_builder)
-builder.add_node("assistant", assistant)
-builder.add_node("tools", ToolNode(tools))
-
-# Define edges
-builder.add_edge(START, "intent_checker")
-builder.add_edge("intent_checker", "info_extractor")
-builder.add_edge("info_extractor", "prompt_builder")
-builder.add_edge("prompt_builder", "assistant")
-builder.add_conditional_edges(
-    "assistant",
-    tools_condition,  # Esto determina si vamos a tools o END
-)
-builder.add_edge("tools", "intent_checker")  # Volver a verificar intención después de usar herramientas
-
-# Compile graph
-react_graph = builder.compile()
\ No newline at end of file
+def build_graph(parallel_extraction: bool = PARALLEL_EXTRACTION):
+    """Builds the agent graph, optionally merging intent detection and extraction into one concurrent node."""
+    builder = StateGraph(State)
+
+    # Define nodes
+    if parallel_extraction:
+        builder.add_node("intent_and_info", intent_and_info)
+        first_node, last_node = "intent_and_info", "intent_and_info"
+    else:
+        builder.add_node("intent_checker", intent_checker)
+        builder.add_node("info_extractor", info_extractor)
+        builder.add_edge("intent_checker", "info_extractor")
+        first_node, last_node = "intent_checker", "info_extractor"
+    builder.add_node("prompt_builder", prompt_builder)
+    builder.add_node("assistant", assistant)
+    builder.add_node("tools", ToolNode(tools))
+
+    # Define edges
+    builder.add_edge(START, first_node)
+    builder.add_edge(last_node, "prompt_builder")
+    builder.add_edge("prompt_builder", "assistant")
+    builder.add_conditional_edges(
+        "assistant",
+        tools_condition,  # Esto determina si vamos a tools o END
+    )
+    builder.add_edge("tools", first_node)  # Volver a verificar intención después de usar herramientas
+
+    # Compile graph
+    return builder.compile()
+
+
+react_graph = build_graph()
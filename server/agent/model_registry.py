@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from .constants import MODELS_DIR, SUPPORTED_BRANDS
+from .tree_inference import CompiledModel, compile_model
+from .utils import load_xgboost_model
+
+# Motor de inferencia: "xgboost" (predict del XGBRegressor) o "numpy" (árboles aplanados)
+PRICE_INFERENCE_BACKEND = os.getenv("PRICE_INFERENCE_BACKEND", "xgboost").lower()
+# Con "numpy", los lotes más grandes que esto se siguen evaluando con XGBoost
+PRICE_INFERENCE_NUMPY_MAX_ROWS = int(os.getenv("PRICE_INFERENCE_NUMPY_MAX_ROWS", "256"))
+
+
+@dataclass
+class ModelEntry:
+    """Booster cargado para una marca junto con sus métricas de carga."""
+    model: Any
+    mtime: Optional[float]
+    load_time_ms: float
+    memory_bytes: int
+    loaded_at: float
+
+
+def _file_mtime(path) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _model_memory_bytes(model) -> int:
+    """Aproxima la memoria del booster a partir de su buffer serializado."""
+    try:
+        size = len(model.get_booster().save_raw())
+    except Exception:
+        return 0
+    if isinstance(model, CompiledModel):
+        size += model.ensemble.memory_bytes
+    return size
+
+
+class ModelRegistry:
+    """Process-wide cache of the per-brand XGBoost boosters.
+
+    Each booster is parsed from disk once and reused for every prediction.
+    The file mtime is checked on access so a replaced ``.bin`` is reloaded
+    without restarting the server.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, brands: Optional[Dict[str, str]] = None,
+                 backend: str = PRICE_INFERENCE_BACKEND):
+        self.models_dir = models_dir
+        self.brands = brands if brands is not None else SUPPORTED_BRANDS
+        self.backend = backend
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.Lock()
+
+    def model_path(self, brand: str):
+        return self.models_dir / self.brands[brand]
+
+    def version(self, brand: str) -> Optional[float]:
+        """Devuelve la versión (mtime) del fichero del modelo o None si no existe."""
+        brand = brand.lower()
+        if brand not in self.brands:
+            return None
+        return _file_mtime(self.model_path(brand))
+
+    def get(self, brand: str):
+        """Devuelve el booster de la marca, cargándolo solo si no está en caché o ha cambiado."""
+        brand = brand.lower()
+        if brand not in self.brands:
+            print(f"Brand {brand} not supported")
+            return None
+
+        mtime = self.version(brand)
+        entry = self._entries.get(brand)
+        if entry is not None and entry.mtime == mtime:
+            return entry.model
+
+        with self._lock:
+            # Otro hilo puede haber cargado el modelo mientras esperábamos
+            entry = self._entries.get(brand)
+            if entry is not None and entry.mtime == mtime:
+                return entry.model
+            return self._load(brand, mtime).model
+
+    def _load(self, brand: str, mtime: Optional[float]) -> ModelEntry:
+        if mtime is None:
+            print(f"Model file {self.model_path(brand)} not found")
+            model = None
+            load_time_ms = 0.0
+        else:
+            if brand in self._entries:
+                print(f"Model file for {brand} changed, reloading")
+            start = time.perf_counter()
+            model = load_xgboost_model(brand)
+            if model is not None:
+                model = compile_model(model, self.backend, PRICE_INFERENCE_NUMPY_MAX_ROWS)
+            load_time_ms = (time.perf_counter() - start) * 1000
+
+        entry = ModelEntry(
+            model=model,
+            mtime=mtime,
+            load_time_ms=round(load_time_ms, 2),
+            memory_bytes=_model_memory_bytes(model) if model is not None else 0,
+            loaded_at=time.time(),
+        )
+        self._entries[brand] = entry
+
+        if model is not None:
+            print(
+                f"Loaded XGBoost model for {brand} in {entry.load_time_ms} ms ({entry.memory_bytes} bytes, {self.stats()[brand]['backend']} backend)")
+        return entry
+
+    def warm_up(self, brands: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Carga por adelantado los modelos indicados (todas las marcas por defecto)."""
+        for brand in brands or self.brands:
+            self.get(brand)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Tiempo de carga y memoria aproximada de cada modelo cargado."""
+        return {
+            brand: {
+                "loaded": entry.model is not None,
+                "backend": "numpy" if isinstance(entry.model, CompiledModel) else "xgboost",
+                "load_time_ms": entry.load_time_ms,
+                "memory_bytes": entry.memory_bytes,
+                "mtime": entry.mtime,
+                "loaded_at": entry.loaded_at,
+            }
+            for brand, entry in self._entries.items()
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Registro global compartido por todas las herramientas
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,282 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+# Puntuación mínima (coeficiente de Dice sobre trigramas) para aceptar una coincidencia aproximada
+MODEL_MATCH_THRESHOLD = float(os.getenv("MODEL_MATCH_THRESHOLD", "0.6"))
+
+# Nombres con los que los usuarios se refieren a una marca
+BRAND_ALIASES = {
+    "iphone": "apple",
+    "galaxy": "samsung",
+    "redmi": "xiaomi",
+    "poco": "xiaomi",
+    "mi": "xiaomi",
+    "pixel": "google",
+    "moto": "motorola",
+    "one plus": "oneplus",
+}
+
+# Alias de modelos que no se deducen del nombre (normalizado -> nombre de Modelo_REF.csv)
+MODEL_ALIASES = {
+    "iphone se 2": "iPhone SE 2020",
+    "iphone se 2a generacion": "iPhone SE 2020",
+    "iphone se segunda generacion": "iPhone SE 2020",
+    "iphone se 3": "iPhone SE 2022",
+    "iphone se 3a generacion": "iPhone SE 2022",
+    "iphone se tercera generacion": "iPhone SE 2022",
+    "iphone 10": "iPhone X",
+    "iphone 10s": "iPhone XS",
+    "iphone 10s max": "iPhone XS Max",
+    "iphone 10r": "iPhone XR",
+}
+
+# Palabras que distinguen variantes de un mismo modelo ("S23" frente a "S23 Ultra")
+VARIANT_WORDS = {"plus", "pro", "max", "ultra", "mini", "lite", "fe", "se", "note", "fold", "flip"}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_NUMBER = re.compile(r"\d+")
+# Letras pegadas al final del número: la "e" de "s10e", la "t" de "11t", la "plus" de "s10plus"
+_NUMBER_SUFFIX = re.compile(r"\d([a-z]+)$")
+_NETWORK = re.compile(r"^[45]g$")
+
+
+def normalize_name(text: str) -> str:
+    """Minúsculas, sin tildes ni signos, con "+" como "plus" y un solo espacio entre palabras."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    text = text.lower().replace("+", " plus ")
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def _compact(name: str) -> str:
+    # "galaxy z fold 4" y "galaxy z fold4" comparten clave
+    return name.replace(" ", "")
+
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    """Si b se obtiene de a con una inserción, borrado, sustitución o trasposición."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (
+            len(diffs) == 2 and diffs[1] == diffs[0] + 1
+            and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    shorter, longer = sorted((a, b), key=len)
+    return any(longer[:i] + longer[i + 1:] == shorter for i in range(len(longer)))
+
+
+def _variant_word(token: str) -> Optional[str]:
+    """Palabra de variante que corresponde al token, admitiendo una errata ("mx" -> "max")."""
+    if token in VARIANT_WORDS:
+        return token
+    if len(token) < 2 or not token.isalpha():
+        return None
+    # Las palabras de dos letras ("fe", "se") solo se aceptan exactas
+    matches = [word for word in VARIANT_WORDS if len(word) > 2 and _one_edit_apart(token, word)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _variant(name: str) -> frozenset:
+    """Números y marcas de variante del nombre, sin contar el 4G/5G.
+
+    Deben coincidir en las coincidencias aproximadas: "S10e" no es "S10+"
+    aunque los trigramas se parezcan.
+    """
+    variant = set()
+    for token in name.split():
+        if _NETWORK.match(token):
+            continue
+        variant.update(_NUMBER.findall(token))
+        suffix = _NUMBER_SUFFIX.search(token)
+        word = suffix.group(1) if suffix else _variant_word(token)
+        if word:
+            variant.add(word)
+    return frozenset(variant)
+
+
+def _trigrams(name: str) -> set:
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ModelMatch(NamedTuple):
+    name: str
+    model_id: int
+    brand: Optional[str]
+    score: float
+    method: str
+
+
+class ModelResolver:
+    """Resuelve el nombre de modelo que da el usuario al de Modelo_REF.csv.
+
+    Se construye una vez al arrancar. Primero se prueba el nombre normalizado
+    (con la misma precedencia 5G que la búsqueda original), después las
+    variantes con y sin marca y los alias, y por último un índice invertido de
+    trigramas de caracteres que devuelve los candidatos más parecidos.
+    """
+
+    def __init__(self, model_reference: Dict[str, int], brand_models: Dict[str, List[str]]):
+        self.model_reference = model_reference
+        self.brand_of: Dict[str, str] = {
+            model: brand for brand, models in brand_models.items() for model in models}
+        self.brands = set(brand_models)
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+        # Nombre normalizado exacto -> nombre de referencia (la búsqueda original)
+        self.exact: Dict[str, str] = {}
+        # Clave compacta de nombres derivados y alias -> nombres de referencia, por prioridad
+        self.aliases: Dict[str, List[str]] = {}
+        # Índice invertido: trigrama -> posiciones en self.keys
+        self.keys: List[str] = []
+        self.key_names: List[str] = []
+        self.key_variants: List[frozenset] = []
+        self.key_sizes: List[int] = []
+        self.index: Dict[str, List[int]] = {}
+
+        for name in model_reference:
+            self.exact.setdefault(normalize_name(name), name)
+        for name in model_reference:
+            for key in self._derived_keys(name):
+                self._add_alias(key, name)
+        for alias, name in MODEL_ALIASES.items():
+            if name in model_reference:
+                self._add_alias(alias, name)
+
+    def _derived_keys(self, name: str) -> List[str]:
+        """Formas en las que se puede escribir un modelo: con y sin marca y sin "galaxy"."""
+        normalized = normalize_name(name)
+        brand = self.brand_of.get(name)
+        keys = [normalized]
+        if brand:
+            if normalized.startswith(f"{brand} "):
+                keys.append(normalized[len(brand) + 1:])
+            else:
+                keys.append(f"{brand} {normalized}")
+        if normalized.startswith("galaxy "):
+            keys.append(normalized[len("galaxy "):])
+        return keys
+
+    def _add_alias(self, key: str, name: str) -> None:
+        names = self.aliases.setdefault(_compact(key), [])
+        if name not in names:
+            names.append(name)
+
+        position = len(self.keys)
+        self.keys.append(key)
+        self.key_names.append(name)
+        self.key_variants.append(_variant(key))
+        trigrams = _trigrams(key)
+        self.key_sizes.append(len(trigrams))
+        for trigram in trigrams:
+            self.index.setdefault(trigram, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self.model_reference)
+
+    def resolve_brand(self, brand: Optional[str]) -> Optional[str]:
+        """Marca en minúsculas tal como aparece en la referencia ("iPhone" -> "apple")."""
+        if not brand:
+            return None
+        normalized = normalize_name(brand)
+        for candidate in (normalized, normalized.split(" ")[0] if normalized else ""):
+            if candidate in self.brands:
+                return candidate
+            if candidate in BRAND_ALIASES:
+                return BRAND_ALIASES[candidate]
+        # Marca desconocida: se devuelve tal cual para que el error la muestre
+        return brand.lower()
+
+    def _match(self, name: str, score: float, method: str) -> ModelMatch:
+        return ModelMatch(name, self.model_reference[name], self.brand_of.get(name), score, method)
+
+    def _brand_allows(self, name: str, brand: Optional[str]) -> bool:
+        return brand is None or brand not in self.brands or self.brand_of.get(name) == brand
+
+    def _lookup_alias(self, key: str, brand: Optional[str]) -> Optional[str]:
+        for name in self.aliases.get(_compact(key), []):
+            if self._brand_allows(name, brand):
+                return name
+        return None
+
+    def candidates(self, model: str, brand: Optional[str] = None, k: int = 5, same_variant: bool = True) -> List[ModelMatch]:
+        """Los k modelos más parecidos según los trigramas, con su puntuación.
+
+        Con same_variant solo se consideran modelos con los mismos números y
+        variantes ("iPhone 16" no debe resolverse como "iPhone 15", ni
+        "Galaxy S10e" como "Galaxy S10+"); sin él se usan como sugerencias.
+        """
+        query = normalize_name(model)
+        brand = self.resolve_brand(brand)
+        if brand and query.startswith(f"{brand} "):
+            query = query[len(brand) + 1:]
+        if not query:
+            return []
+
+        trigrams = _trigrams(query)
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self.index.get(trigram, ()))
+
+        variant = _variant(query)
+        best: Dict[str, float] = {}
+        for position, common in shared.items():
+            name = self.key_names[position]
+            if (same_variant and self.key_variants[position] != variant) or not self._brand_allows(name, brand):
+                continue
+            score = 2 * common / (len(trigrams) + self.key_sizes[position])
+            if score > best.get(name, 0.0):
+                best[name] = score
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [self._match(name, round(score, 3), "fuzzy") for name, score in ranked]
+
+    def resolve(self, model: str, brand: Optional[str] = None, has_5g: bool = False) -> Optional[ModelMatch]:
+        """Mejor coincidencia para el modelo, o None si ninguna es lo bastante parecida."""
+        match = self._resolve(model, brand, has_5g)
+        with self._lock:
+            self.counts[match.method if match else "not_found"] += 1
+        return match
+
+    def _resolve(self, model: str, brand: Optional[str], has_5g: bool) -> Optional[ModelMatch]:
+        query = normalize_name(model)
+        with_5g = f"{query} 5g" if has_5g and "5g" not in query.split() else query
+        without_5g = " ".join(token for token in query.split() if token != "5g")
+
+        # Misma precedencia que la búsqueda exacta original: primero la variante 5G
+        if has_5g and with_5g in self.exact:
+            return self._match(self.exact[with_5g], 1.0, "exact")
+        if without_5g in self.exact:
+            return self._match(self.exact[without_5g], 1.0, "exact")
+
+        # Nombres derivados y alias, respetando la marca si se conoce
+        brand = self.resolve_brand(brand)
+        queries = [with_5g, without_5g, query, f"{without_5g} 5g"] if has_5g else [without_5g, query, f"{without_5g} 5g"]
+        if brand and query.startswith(f"{brand} "):
+            queries += [key[len(brand) + 1:] for key in queries if key.startswith(f"{brand} ")]
+        for key in queries:
+            name = self._lookup_alias(key, brand)
+            if name:
+                return self._match(name, 1.0, "alias")
+
+        # Coincidencia aproximada por trigramas
+        candidates = self.candidates(query, brand, k=2)
+        if not candidates or candidates[0].score < MODEL_MATCH_THRESHOLD:
+            return None
+        # Dos modelos distintos con la misma puntuación: mejor preguntar al usuario
+        if len(candidates) > 1 and candidates[1].score == candidates[0].score:
+            return None
+        return candidates[0]
+
+    def models_for_brand(self, brand: Optional[str]) -> List[str]:
+        brand = self.resolve_brand(brand)
+        return [name for name, model_brand in self.brand_of.items() if model_brand == brand]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"models": len(self.model_reference), "keys": len(self.keys), **self.counts}
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_openai import ChatOpenAI
+
+from .llm_cache import LLM_CACHE
+
+
+def _route(node: str, model: str, temperature: float, timeout: float, fallback: str, cache: bool = False) -> Dict[str, Any]:
+    """Configuración de un nodo, sobrescribible con LLM_<NODO>_MODEL, _TIMEOUT y _FALLBACK."""
+    prefix = f"LLM_{node.upper()}"
+    return {
+        "model": os.getenv(f"{prefix}_MODEL", model),
+        "temperature": temperature,
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+        "fallback": os.getenv(f"{prefix}_FALLBACK", fallback),
+        "cache": cache,
+    }
+
+
+# Modelo por nodo del grafo: uno barato para clasificar, extraer y resumir, GPT-4 para responder.
+# En el asistente se cachea la respuesta a la conversación, no los datos: las llamadas a
+# herramientas cacheadas se ejecutan de nuevo, y los precios y fechas que devuelven forman
+# parte del prompt de la respuesta final. El resumen no se cachea: su prompt incluye el
+# resumen anterior y casi nunca se repite.
+MODEL_ROUTES = {
+    "intent_checker": _route("intent_checker", "gpt-4o-mini", 0, 10, "gpt-4", cache=True),
+    "info_extractor": _route("info_extractor", "gpt-4o-mini", 0, 20, "gpt-4", cache=True),
+    "summarizer": _route("summarizer", "gpt-4o-mini", 0, 30, "gpt-4"),
+    "assistant": _route("assistant", "gpt-4", 0, 60, "gpt-4o-mini", cache=True),
+    "title": _route("title", "gpt-4o-mini", 0.7, 15, "", cache=True),
+}
+
+
+class NodeMetrics(BaseCallbackHandler):
+    """Latencia, errores y tokens de las llamadas al LLM de cada nodo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, tuple] = {}
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+
+    def _node_stats(self, node: str) -> Dict[str, Any]:
+        return self.nodes.setdefault(node, {
+            "calls": 0, "errors": 0, "total_ms": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "models": {},
+        })
+
+    def start(self, node: str, run_id: UUID, model: str) -> None:
+        with self._lock:
+            self._started[run_id] = (node, model, time.perf_counter())
+
+    def end(self, run_id: UUID, response: Optional[LLMResult] = None, error: bool = False) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            node, model, started_at = started
+            stats = self._node_stats(node)
+            stats["calls"] += 1
+            stats["total_ms"] += (time.perf_counter() - started_at) * 1000
+            stats["models"][model] = stats["models"].get(model, 0) + 1
+            if error:
+                stats["errors"] += 1
+            usage = ((response.llm_output or {}).get("token_usage") or {}) if response else {}
+            stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            stats["completion_tokens"] += usage.get("completion_tokens", 0)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                node: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_latency_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0,
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "models": dict(stats["models"]),
+                }
+                for node, stats in self.nodes.items()
+            }
+
+
+NODE_METRICS = NodeMetrics()
+
+
+class _NodeCallback(BaseCallbackHandler):
+    """Asocia las llamadas de un ChatOpenAI concreto a su nodo en NODE_METRICS."""
+
+    def __init__(self, node: str, model: str):
+        self.node = node
+        self.model = model
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID, **kwargs: Any) -> None:
+        NODE_METRICS.start(self.node, run_id, self.model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        NODE_METRICS.end(run_id, response)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        NODE_METRICS.end(run_id, error=True)
+
+
+def _chat_model(node: str, model: str, route: Dict[str, Any]) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=model,
+        temperature=route["temperature"],
+        timeout=route["timeout"],
+        max_retries=1,
+        # False desactiva también una caché global de LangChain
+        cache=LLM_CACHE if route["cache"] and LLM_CACHE else False,
+        callbacks=[_NodeCallback(node, model)],
+    )
+
+
+def get_llm(node: str, tools: Optional[list] = None):
+    """LLM configurado para un nodo, con sus herramientas y el modelo de respaldo si lo tiene."""
+    route = MODEL_ROUTES[node]
+    primary = _chat_model(node, route["model"], route)
+    if tools:
+        primary = primary.bind_tools(tools)
+    if not route["fallback"]:
+        return primary
+
+    fallback = _chat_model(node, route["fallback"], route)
+    if tools:
+        fallback = fallback.bind_tools(tools)
+    return primary.with_fallbacks([fallback])
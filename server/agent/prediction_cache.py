@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "8192"))
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+
+
+class PredictionCache:
+    """Caché LRU con caducidad de los precios predichos por XGBoost.
+
+    La clave es el vector de features ya resuelto (marca, Modelo,
+    Almacenamiento, días desde el lanzamiento, Grado) junto con la versión
+    del fichero del modelo, de modo que un modelo nuevo no reutiliza
+    predicciones antiguas.
+    """
+
+    def __init__(self, maxsize: int = 8192, ttl_seconds: int = 3600):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # clave -> (instante de caducidad, precio)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[float]]:
+        """Precio cacheado para cada clave, o None si no está o ha caducado."""
+        now = time.time()
+        values: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    values.append(entry[1])
+                    self.hits += 1
+                    continue
+                if entry is not None:
+                    del self._entries[key]
+                values.append(None)
+                self.misses += 1
+        return values
+
+    def put_many(self, keys: Sequence[Hashable], values: Sequence[float]) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+PREDICTION_CACHE = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
@@ -0,0 +1,96 @@
+import threading
+from bisect import bisect_right
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .model_registry import MODEL_REGISTRY
+
+
+class PriceTable:
+    """Tabla precalculada de precios de venta para todas las combinaciones (modelo, almacenamiento, grado).
+
+    Las filas se guardan ordenadas por precio final, de modo que una consulta
+    por presupuesto es una búsqueda binaria más un filtro. Cada marca se
+    reconstruye por separado cuando cambia el día o su fichero de modelo.
+    """
+
+    def __init__(
+        self,
+        build_rows: Callable[[str, date], List[Dict[str, Any]]],
+        brands: Callable[[], Iterable[str]],
+        version: Callable[[str], Any] = MODEL_REGISTRY.version,
+    ):
+        self._build_rows = build_rows
+        self._brands = brands
+        self._version = version
+        self._lock = threading.Lock()
+        # marca -> (clave de versión, precios ordenados, filas ordenadas)
+        self._by_brand: Dict[str, Tuple[Any, List[float], List[Dict[str, Any]]]] = {}
+        self._all: Tuple[List[float], List[Dict[str, Any]]] = ([], [])
+
+    def _stale_brands(self, today: date) -> List[str]:
+        stale = []
+        for brand in self._brands():
+            entry = self._by_brand.get(brand)
+            if entry is None or entry[0] != (today, self._version(brand)):
+                stale.append(brand)
+        return stale
+
+    def refresh(self, today: Optional[date] = None) -> List[str]:
+        """Reconstruye solo las marcas desactualizadas y devuelve cuáles se han recalculado."""
+        today = today or date.today()
+        if not self._stale_brands(today):
+            return []
+
+        with self._lock:
+            stale = self._stale_brands(today)
+            for brand in stale:
+                key = (today, self._version(brand))
+                rows = sorted(self._build_rows(brand, today),
+                              key=lambda row: row["estimated_price"])
+                self._by_brand[brand] = (
+                    key, [row["estimated_price"] for row in rows], rows)
+
+            if stale:
+                merged = sorted(
+                    (row for _, _, rows in self._by_brand.values() for row in rows),
+                    key=lambda row: row["estimated_price"])
+                self._all = ([row["estimated_price"] for row in merged], merged)
+                print(
+                    f"Price table refreshed for {len(stale)} brands ({len(merged)} rows)")
+            return stale
+
+    def query(
+        self,
+        budget: float,
+        brand: Optional[str] = None,
+        storage_gb: Optional[int] = None,
+        grade: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Devuelve las filas más caras que no superan el presupuesto, filtradas por preferencias."""
+        self.refresh()
+
+        if brand:
+            entry = self._by_brand.get(brand.lower())
+            if entry is None:
+                return []
+            _, prices, rows = entry
+        else:
+            prices, rows = self._all
+
+        results = []
+        # Recorrer desde el precio más alto dentro del presupuesto hacia abajo
+        for i in range(bisect_right(prices, budget) - 1, -1, -1):
+            row = rows[i]
+            if storage_gb is not None and row["storage_gb"] != storage_gb:
+                continue
+            if grade and row["grade"] != grade:
+                continue
+            results.append(row)
+            if len(results) >= limit:
+                break
+        return results
+
+    def __len__(self) -> int:
+        return len(self._all[1])
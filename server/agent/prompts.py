@@ -299,6 +299,9 @@ Una vez tengas el rango de fechas, debes responder con un array de fechas, sigui
    4. Otros casos:
       - El usuario indica que quiere ver la evolucion de los precios en el mes de marzo, si no proporciona el {{año}} deberás preguntarlo.
       - Debes responder con: ["01-03-{{año}}", "02-03-{{año}}", ..., "31-03-{{año}}"]
+   5. Rangos largos:
+      - Para rangos con muchos puntos puedes invocar generate_graphic_dict con start_date y end_date (DD-MM-YYYY) y step_days en lugar de date_range
+      - Ejemplo: un año de precios diarios → start_date="01-01-2023", end_date="31-12-2023", step_days=1
 
 REQUISITO CRÍTICO DE FORMATO:
 Tu respuesta debe seguir EXACTAMENTE este formato y NO DEBE INCLUIR NINGÚN OTRO CONTENIDO:
@@ -401,3 +404,25 @@ BUYING_INFO_EXTRACT_PROMPT = """Actúa como un parseador de información. Tu tar
    EJEMPLO DE SALIDA CON DATOS FALTANTES:
    {{"budget": 200, "brand_preference": "", "min_storage": null, "grade_preference": ""}}
 """
+
+INCREMENTAL_EXTRACTION_CONTEXT = """INFORMACIÓN YA EXTRAÍDA EN TURNOS ANTERIORES (consérvala, corrígela si el usuario da otro valor y complétala con los nuevos mensajes):
+{current_info}
+
+NUEVOS MENSAJES:
+{messages}"""
+
+CONVERSATION_SUMMARY_PROMPT = """Resume la conversación entre un usuario y TradeMind, un asistente de compra-venta de smartphones de segunda mano.
+
+RESUMEN ANTERIOR:
+{summary}
+
+NUEVOS MENSAJES:
+{messages}
+
+Escribe un único resumen actualizado, breve y en español, que combine el resumen anterior con los nuevos mensajes. Conserva los datos concretos (marcas, modelos, almacenamiento, estado, precios, presupuestos y decisiones del usuario) y omite saludos y cortesías.
+
+RESPONDE ÚNICAMENTE CON EL RESUMEN."""
+
+CONVERSATION_SUMMARY_CONTEXT = """
+RESUMEN DE LA CONVERSACIÓN ANTERIOR (los mensajes más antiguos ya no se incluyen):
+{summary}"""
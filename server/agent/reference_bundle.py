@@ -0,0 +1,209 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .constants import DATA_DIR
+
+# Versión del formato del bundle; un bundle de otra versión se ignora
+BUNDLE_FORMAT_VERSION = 1
+REFERENCE_BUNDLE_PATH = Path(os.getenv("REFERENCE_BUNDLE_PATH", str(DATA_DIR / "reference.sqlite")))
+
+# Ficheros de origen y cabeceras esperadas
+SOURCE_FILES = {
+    "Modelo_REF.csv": ["Modelo", "Modelo_NUM"],
+    "Marca_Modelo_REF.csv": ["Marca", "Modelo"],
+    "Fecha_Lanzamiento.csv": ["Modelo", "Fecha de Lanzamiento"],
+}
+
+
+@dataclass
+class ReferenceData:
+    """Datos de referencia de modelos, en el orden de los CSV."""
+    model_reference: Dict[str, int]
+    brand_models: Dict[str, List[str]]
+    release_dates: List[Tuple[str, date]]
+    source: str = "csv"
+
+    def canonical_rows(self) -> dict:
+        return {
+            "models": [[name, model_id] for name, model_id in self.model_reference.items()],
+            "brand_models": [[brand, name] for brand, names in self.brand_models.items() for name in names],
+            "release_dates": [[name, release_date.isoformat()] for name, release_date in self.release_dates],
+        }
+
+    def checksum(self) -> str:
+        """SHA-256 del contenido, independiente de cómo esté almacenado."""
+        payload = json.dumps(self.canonical_rows(), ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def source_checksum(data_dir: Path = DATA_DIR) -> str:
+    """SHA-256 de los tres CSV, para detectar un bundle generado con datos antiguos."""
+    digest = hashlib.sha256()
+    for filename in SOURCE_FILES:
+        digest.update(filename.encode("utf-8"))
+        digest.update((data_dir / filename).read_bytes())
+    return digest.hexdigest()
+
+
+def source_stats(data_dir: Path = DATA_DIR) -> Dict[str, List[int]]:
+    """Tamaño y mtime de los CSV: comprobarlos no obliga a leer los ficheros."""
+    stats = {}
+    for filename in SOURCE_FILES:
+        stat = (data_dir / filename).stat()
+        stats[filename] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def _read_rows(path: Path, header: List[str], errors: List[str]) -> List[List[str]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f, delimiter=";")
+        found = next(reader, [])
+        if found != header:
+            errors.append(f"{path.name}: expected columns {header}, found {found}")
+            return []
+        rows = []
+        for line, row in enumerate(reader, start=2):
+            if not any(value.strip() for value in row):
+                continue
+            if len(row) != len(header) or not all(value.strip() for value in row):
+                errors.append(f"{path.name}:{line}: incomplete row {row}")
+                continue
+            rows.append(row)
+        return rows
+
+
+def read_reference_csvs(data_dir: Path = DATA_DIR, strict: bool = True) -> ReferenceData:
+    """Lee y valida los CSV de referencia.
+
+    Con strict se lanza ValueError con todos los problemas encontrados; sin
+    él solo se avisan y se descartan las filas inválidas.
+    """
+    errors: List[str] = []
+
+    model_reference: Dict[str, int] = {}
+    for line, (name, model_id) in enumerate(
+            _read_rows(data_dir / "Modelo_REF.csv", SOURCE_FILES["Modelo_REF.csv"], errors), start=2):
+        if name in model_reference:
+            errors.append(f"Modelo_REF.csv:{line}: duplicated model {name}")
+        try:
+            model_reference[name] = int(model_id)
+        except ValueError:
+            errors.append(f"Modelo_REF.csv:{line}: invalid Modelo_NUM {model_id}")
+    if len(set(model_reference.values())) != len(model_reference):
+        errors.append("Modelo_REF.csv: Modelo_NUM values are not unique")
+
+    brand_models: Dict[str, List[str]] = {}
+    for line, (brand, name) in enumerate(
+            _read_rows(data_dir / "Marca_Modelo_REF.csv", SOURCE_FILES["Marca_Modelo_REF.csv"], errors), start=2):
+        if name not in model_reference:
+            errors.append(f"Marca_Modelo_REF.csv:{line}: model {name} not in Modelo_REF.csv")
+        brand_models.setdefault(brand.lower(), []).append(name)
+
+    release_dates: List[Tuple[str, date]] = []
+    for line, (name, date_str) in enumerate(
+            _read_rows(data_dir / "Fecha_Lanzamiento.csv", SOURCE_FILES["Fecha_Lanzamiento.csv"], errors), start=2):
+        try:
+            release_dates.append((name, datetime.strptime(date_str.split()[0], "%Y-%m-%d").date()))
+        except ValueError:
+            errors.append(f"Fecha_Lanzamiento.csv:{line}: invalid date {date_str}")
+
+    if errors:
+        message = "Invalid reference data:\n" + "\n".join(errors)
+        if strict:
+            raise ValueError(message)
+        print(message)
+    return ReferenceData(model_reference, brand_models, release_dates)
+
+
+def build_bundle(output: Path = REFERENCE_BUNDLE_PATH, data_dir: Path = DATA_DIR) -> ReferenceData:
+    """Valida los CSV y los compila en un único fichero SQLite versionado."""
+    data = read_reference_csvs(data_dir)
+    rows = data.canonical_rows()
+    tmp_path = output.with_name(output.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    db = sqlite3.connect(tmp_path)
+    try:
+        # Páginas pequeñas: son unos pocos KB de datos
+        db.executescript("""
+            PRAGMA page_size = 1024;
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE models (position INTEGER PRIMARY KEY, name TEXT NOT NULL, model_id INTEGER NOT NULL);
+            CREATE TABLE brand_models (position INTEGER PRIMARY KEY, brand TEXT NOT NULL, name TEXT NOT NULL);
+            CREATE TABLE release_dates (position INTEGER PRIMARY KEY, name TEXT NOT NULL, release_date TEXT NOT NULL);
+        """)
+        for table, columns in (("models", "name, model_id"),
+                               ("brand_models", "brand, name"),
+                               ("release_dates", "name, release_date")):
+            db.executemany(f"INSERT INTO {table} ({columns}) VALUES (?, ?)", rows[table])
+        db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ("format_version", str(BUNDLE_FORMAT_VERSION)),
+            ("checksum", data.checksum()),
+            ("source_checksum", source_checksum(data_dir)),
+            ("source_stats", json.dumps(source_stats(data_dir))),
+            ("built_at", datetime.now().isoformat(timespec="seconds")),
+        ])
+        db.commit()
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    # Sustituir el bundle de una vez para que nunca se lea a medio escribir
+    os.replace(tmp_path, output)
+    return data
+
+
+def load_bundle(path: Path = REFERENCE_BUNDLE_PATH, data_dir: Path = DATA_DIR) -> ReferenceData:
+    """Carga el bundle comprobando versión, checksum y que los CSV no hayan cambiado."""
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        meta = dict(db.execute("SELECT key, value FROM meta"))
+        if meta.get("format_version") != str(BUNDLE_FORMAT_VERSION):
+            raise ValueError(f"bundle format {meta.get('format_version')}, expected {BUNDLE_FORMAT_VERSION}")
+
+        model_reference = dict(db.execute("SELECT name, model_id FROM models ORDER BY position"))
+        brand_models: Dict[str, List[str]] = {}
+        for brand, name in db.execute("SELECT brand, name FROM brand_models ORDER BY position"):
+            brand_models.setdefault(brand, []).append(name)
+        release_dates = [
+            (name, date.fromisoformat(release_date))
+            for name, release_date in db.execute("SELECT name, release_date FROM release_dates ORDER BY position")
+        ]
+    finally:
+        db.close()
+
+    data = ReferenceData(model_reference, brand_models, release_dates, source="bundle")
+    if data.checksum() != meta.get("checksum"):
+        raise ValueError("bundle checksum mismatch")
+    # Si los CSV están presentes y han cambiado, el bundle está desactualizado. Basta
+    # con comparar tamaño y mtime; solo si difieren (p. ej. tras un checkout) se
+    # calcula el checksum para distinguir un fichero tocado de uno modificado
+    if all((data_dir / filename).exists() for filename in SOURCE_FILES) and \
+            source_stats(data_dir) != json.loads(meta.get("source_stats", "null")) and \
+            source_checksum(data_dir) != meta.get("source_checksum"):
+        raise ValueError("bundle is older than the CSV files")
+    return data
+
+
+def load_reference_data(path: Path = REFERENCE_BUNDLE_PATH, data_dir: Path = DATA_DIR) -> ReferenceData:
+    """Datos de referencia desde el bundle o, si no existe o no es válido, desde los CSV."""
+    start = time.perf_counter()
+    if path.exists():
+        try:
+            data = load_bundle(path, data_dir)
+            print(f"Loaded reference bundle {path.name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return data
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Ignoring reference bundle {path}: {e}")
+
+    data = read_reference_csvs(data_dir, strict=False)
+    print(f"Loaded reference CSV files in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return data
@@ -0,0 +1,123 @@
+from bisect import bisect_left
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Fechas conocidas usadas cuando el modelo no aparece en Fecha_Lanzamiento.csv
+HARDCODED_RELEASE_DATES = {
+    # Apple
+    ("Apple", "iPhone 15"): date(2023, 9, 22),
+    ("Apple", "iPhone 14"): date(2022, 9, 16),
+    ("Apple", "iPhone 13"): date(2021, 9, 24),
+    ("Apple", "iPhone 12"): date(2020, 10, 23),
+    ("Apple", "iPhone 11"): date(2019, 9, 20),
+    ("Apple", "iPhone XS"): date(2018, 9, 21),
+    ("Apple", "iPhone X"): date(2017, 11, 3),
+    ("Apple", "iPhone 8"): date(2017, 9, 22),
+    ("Apple", "iPhone 7"): date(2016, 9, 16),
+
+    # Samsung
+    ("Samsung", "Galaxy S24"): date(2024, 1, 31),
+    ("Samsung", "Galaxy S23"): date(2023, 2, 17),
+    ("Samsung", "Galaxy S22"): date(2022, 2, 25),
+    ("Samsung", "Galaxy S21"): date(2021, 1, 29),
+    ("Samsung", "Galaxy S20"): date(2020, 3, 6),
+    ("Samsung", "Galaxy A53"): date(2022, 3, 25),
+    ("Samsung", "Galaxy A13"): date(2022, 3, 23),
+    ("Samsung", "Galaxy A12"): date(2021, 1, 7),
+
+    # Xiaomi
+    ("Xiaomi", "13 Pro"): date(2023, 2, 26),
+    ("Xiaomi", "12 Pro"): date(2022, 3, 15),
+    ("Xiaomi", "11T Pro"): date(2021, 9, 23),
+    ("Xiaomi", "Redmi Note 12"): date(2022, 10, 27),
+    ("Xiaomi", "Redmi Note 11"): date(2022, 1, 26),
+    ("Xiaomi", "Redmi Note 10"): date(2021, 3, 16),
+    ("Xiaomi", "Redmi 10C"): date(2022, 3, 29),
+}
+
+
+class ReleaseDateIndex:
+    """Índice en memoria de las fechas de lanzamiento.
+
+    Las coincidencias exactas se resuelven con un diccionario de nombres en
+    minúsculas. Las parciales usan una lista ordenada de sufijos de todos los
+    nombres: los nombres que contienen un texto son los que tienen un sufijo
+    que empieza por él, y se localizan con búsqueda binaria.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, date]]):
+        self.names: List[str] = []
+        self.dates: List[date] = []
+        self.exact: Dict[str, date] = {}
+        suffixes = []
+
+        for position, (name, release_date) in enumerate(rows):
+            name_lower = name.lower()
+            self.names.append(name)
+            self.dates.append(release_date)
+            # Como en el CSV, la primera fila con un nombre tiene prioridad
+            self.exact.setdefault(name_lower, release_date)
+            suffixes.extend((name_lower[i:], position)
+                            for i in range(len(name_lower)))
+
+        suffixes.sort()
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_rows = [position for _, position in suffixes]
+        self.first_containing = lru_cache(maxsize=4096)(self._first_containing)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _first_containing(self, text: str) -> Optional[int]:
+        """Posición de la primera fila cuyo nombre contiene el texto (ya en minúsculas)."""
+        first = None
+        i = bisect_left(self._suffixes, text)
+        while i < len(self._suffixes) and self._suffixes[i].startswith(text):
+            position = self._suffix_rows[i]
+            if first is None or position < first:
+                first = position
+            i += 1
+        return first
+
+    def lookup(self, brand: str, model: str, has_5g: bool = False) -> Optional[date]:
+        """Busca la fecha en los datos del CSV con la misma precedencia que la búsqueda original."""
+        model_with_5g = f"{model} 5G" if has_5g and "5G" not in model else None
+
+        # En el CSV, el formato es: "Marca Modelo"
+        full_name = f"{brand} {model}"
+
+        # Coincidencias exactas
+        for search_term in [full_name, model_with_5g, f"{brand} {model_with_5g}" if model_with_5g else None]:
+            if search_term and search_term.lower() in self.exact:
+                return self.exact[search_term.lower()]
+
+        # Búsqueda parcial: la primera fila del CSV que contenga alguno de los términos
+        positions = [
+            self.first_containing(term.lower())
+            for term in (model, full_name, model_with_5g) if term
+        ]
+        positions = [position for position in positions if position is not None]
+        if positions:
+            return self.dates[min(positions)]
+
+        return None
+
+
+# Fechas hardcodeadas agrupadas por marca para la búsqueda parcial
+_HARDCODED_BY_BRAND: Dict[str, List[Tuple[str, date]]] = {}
+for (_brand, _model), _date in HARDCODED_RELEASE_DATES.items():
+    _HARDCODED_BY_BRAND.setdefault(_brand.lower(), []).append((_model, _date))
+
+
+def hardcoded_release_date(brand: str, model: str) -> Optional[date]:
+    """Busca la fecha en la tabla hardcodeada, primero exacta y luego parcial."""
+    key = (brand, model)
+    if key in HARDCODED_RELEASE_DATES:
+        return HARDCODED_RELEASE_DATES[key]
+
+    for known_model, release_date in _HARDCODED_BY_BRAND.get(brand.lower(), []):
+        if known_model in model:
+            return release_date
+
+    return None
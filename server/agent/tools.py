@@ -1,16 +1,23 @@
-from datetime import date
+from datetime import date, timedelta
 import random
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Optional, Tuple, Union, Dict, Any
 import numpy as np
 
 from .models import DeviceInfo
-from .utils import load_brand_model_reference, load_model_reference, load_xgboost_model, parse_date
-from .constants import SUPPORTED_BRANDS, GRADE_MAPPING, MODELS_DIR, DATA_DIR
+from .utils import load_brand_model_reference, load_model_reference, load_release_dates, parse_date
+from .model_registry import MODEL_REGISTRY
+from .model_resolver import ModelResolver
+from .prediction_cache import PREDICTION_CACHE
+from .price_table import PriceTable
+from .release_dates import ReleaseDateIndex, hardcoded_release_date
+from .constants import SUPPORTED_BRANDS, GRADE_MAPPING, GRADE_OPTIONS, MARKUP_BY_BRAND, STORAGE_OPTIONS
 
 # Variable global para el mapeo de modelos
 MODEL_REFERENCE = {}
 # Variable global para el mapeo de marcas y modelos
 BRAND_MODEL_MAP = {}
+# Índice de fechas de lanzamiento
+RELEASE_DATE_INDEX = ReleaseDateIndex([])
 
 # Inicializar la referencia de modelos y el mapeo de marcas y modelos
 try:
@@ -25,25 +32,58 @@ try:
 except Exception as e:
     print(f"Could not initialize brand-model reference: {e}")
 
+# Resolución de nombres de modelo compartida por todas las herramientas
+MODEL_RESOLVER = ModelResolver(MODEL_REFERENCE, BRAND_MODEL_MAP)
 
-def predict_price(
-    brand: str,
-    model: str,
-    storage: str,
-    has_5g: bool,
-    release_date: Union[str, date],
-    grade: str = 'C',
-    sale_date: Union[str, date] = date.today()
-) -> Union[float, Dict[str, Any]]:
-    """Predicts the selling price of a device based on its characteristics."""
+try:
+    RELEASE_DATE_INDEX = ReleaseDateIndex(load_release_dates())
+    print(f"Loaded {len(RELEASE_DATE_INDEX)} release dates")
+except Exception as e:
+    print(f"Could not initialize release dates: {e}")
 
-    print(
-        f"Predicting price for {brand} {model} ({storage}, 5G: {has_5g}, grade: {grade})")
-    print(f"Release date: {release_date}, sale date: {sale_date}")
 
-    # Convertir fechas
-    release_date = parse_date(release_date)
-    sale_date = parse_date(sale_date)
+def _unsupported_brand_error(brand: str) -> Dict[str, Any]:
+    return {
+        "error": "unsupported_brand",
+        "message": f"Lo siento, actualmente no podemos ofrecer predicciones para dispositivos de la marca {brand}. Las marcas soportadas son: {', '.join(SUPPORTED_BRANDS.keys())}.",
+        "supported_brands": list(SUPPORTED_BRANDS.keys())
+    }
+
+
+def _find_model_id(model: str, has_5g: bool, brand: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
+    """Busca el ID del modelo con MODEL_RESOLVER, probando primero la variante 5G."""
+    match = MODEL_RESOLVER.resolve(model, brand, has_5g)
+    if match is None:
+        return None, None
+    if match.method != "exact":
+        print(f"Resolved model '{model}' to '{match.name}' ({match.method}, score {match.score})")
+    return match.model_id, match.name
+
+
+def _parse_storage(storage: str) -> int:
+    return int(storage.replace("GB", "").replace("TB", "000").strip())
+
+
+def _prediction_error(e: Exception, fecha_lanzamiento: int, grade: str) -> Dict[str, Any]:
+    return {
+        "error": "prediction_error",
+        "message": f"Hubo un error al calcular la predicción: {str(e)}. Utilizaremos una estimación general.",
+        "fallback_price": fallback_predict_price(fecha_lanzamiento, grade)
+    }
+
+
+def _resolve_device(row: Dict[str, Any]) -> Tuple[Optional[str], Optional[List[float]], Optional[Dict[str, Any]]]:
+    """Convierte una fila de especificaciones en (marca, vector de features, error).
+
+    Si la fila no se puede predecir con XGBoost se devuelve el diccionario de
+    error con el mismo formato que usa predict_price.
+    """
+    brand = row["brand"]
+    model = row["model"]
+    grade = row.get("grade") or 'C'
+
+    release_date = parse_date(row["release_date"])
+    sale_date = parse_date(row.get("sale_date") or date.today())
 
     # Calcular días entre fechas
     fecha_lanzamiento = (sale_date - release_date).days
@@ -53,83 +93,138 @@ def predict_price(
         fecha_lanzamiento = 0
 
     # Comprobar si la marca está soportada
-    brand_lower = brand.lower()
+    brand_lower = MODEL_RESOLVER.resolve_brand(brand)
     if brand_lower not in SUPPORTED_BRANDS:
         print(
             f"Brand {brand} not in supported brands: {list(SUPPORTED_BRANDS.keys())}")
-        return {
-            "error": "unsupported_brand",
-            "message": f"Lo siento, actualmente no podemos ofrecer predicciones para dispositivos de la marca {brand}. Las marcas soportadas son: {', '.join(SUPPORTED_BRANDS.keys())}.",
-            "supported_brands": list(SUPPORTED_BRANDS.keys())
-        }
-
-    # Intentar encontrar el ID del modelo en el mapping
-    model_with_5g = f"{model} 5G" if has_5g and "5G" not in model else model
-    model_without_5g = model.replace(" 5G", "") if "5G" in model else model
+        return None, None, _unsupported_brand_error(brand)
 
-    Modelo = None
-    model_used = None
+    Modelo, _ = _find_model_id(model, bool(row.get("has_5g")), brand_lower)
 
-    # Buscar primero con 5G si tiene 5G
-    if has_5g and model_with_5g in MODEL_REFERENCE:
-        Modelo = MODEL_REFERENCE[model_with_5g]
-        model_used = model_with_5g
-    # Si no se encuentra, buscar sin 5G
-    elif model_without_5g in MODEL_REFERENCE:
-        Modelo = MODEL_REFERENCE[model_without_5g]
-        model_used = model_without_5g
-
-    # Si no se encuentra el modelo, devolver un error informativo
+    # Si no se encuentra el modelo, devolver un error informativo con los más parecidos
     if Modelo is None:
         print(f"Model {model} not found in reference data")
-        return {
+        return None, None, {
             "error": "model_not_found",
             "message": f"No encontramos el modelo '{model}' en nuestra base de datos. Podemos hacer una estimación general pero no será tan precisa.",
-            "fallback_price": fallback_predict_price(fecha_lanzamiento, grade)
-        }
-
-    # Cargar el modelo para la marca
-    xgb_model = load_xgboost_model(brand_lower)
-    if xgb_model is None:
-        return {
-            "error": "model_loading_failed",
-            "message": f"Hubo un problema al cargar el modelo de predicción para {brand}. Utilizaremos una estimación general.",
+            "suggestions": [match.name for match in MODEL_RESOLVER.candidates(model, brand_lower, k=3, same_variant=False)],
             "fallback_price": fallback_predict_price(fecha_lanzamiento, grade)
         }
 
     try:
-        print(f"Predicting price for model ID {Modelo} ({model_used})")
+        Almacenamiento = _parse_storage(row["storage"])
+    except Exception as e:
+        print(f"Error during price prediction: {e}")
+        return None, None, _prediction_error(e, fecha_lanzamiento, grade)
 
-        # Preparar datos para el modelo
-        Almacenamiento = int(storage.replace(
-            "GB", "").replace("TB", "000").strip())
-        print("Storage GB:", Almacenamiento)
+    # Mapear grado a número
+    Grado = GRADE_MAPPING.get(grade, 3)  # Por defecto C=3
 
+    return brand_lower, [Modelo, Almacenamiento, fecha_lanzamiento, Grado], None
 
-        # Mapear grado a número
-        Grado = GRADE_MAPPING.get(grade, 3)  # Por defecto C=3
-        print("Grade:", Grado)
 
-        features = np.array([[
-            Modelo, Almacenamiento, fecha_lanzamiento, Grado
-        ]])
+def _predict_features(brand_lower: str, xgb_model, matrix) -> List[float]:
+    """Precios redondeados para cada vector de features, usando PREDICTION_CACHE.
 
-        # Predicción
-        prediction = xgb_model.predict(np.array(features, dtype=np.float32))[0]
+    Solo las filas que no están en caché pasan por el modelo, en una única llamada.
+    """
+    version = MODEL_REGISTRY.version(brand_lower)
+    keys = [(brand_lower, version, *(int(value) for value in features)) for features in matrix]
+    prices = PREDICTION_CACHE.get_many(keys)
 
-        # Redondear a 2 decimales
-        final_price = round(float(prediction), 2)
+    missing = [i for i, price in enumerate(prices) if price is None]
+    if missing:
+        predictions = xgb_model.predict(
+            np.asarray([matrix[i] for i in missing], dtype=np.float32))
+        new_prices = [round(float(prediction), 2) for prediction in predictions]
+        PREDICTION_CACHE.put_many([keys[i] for i in missing], new_prices)
+        for i, price in zip(missing, new_prices):
+            prices[i] = price
+    return prices
 
-        print(f"XGBoost prediction for {brand} {model_used}: {final_price}")
-        return final_price
 
-    except Exception as e:
-        print(f"Error during price prediction: {e}")
-        return {
-            "error": "prediction_error",
-            "message": f"Hubo un error al calcular la predicción: {str(e)}. Utilizaremos una estimación general.",
-            "fallback_price": fallback_predict_price(fecha_lanzamiento, grade)
-        }
+def predict_prices(rows) -> List[Union[float, Dict[str, Any]]]:
+    """Predicts the selling price of many devices with one model call per brand.
+
+    Args:
+        rows: List of dicts (or a DataFrame) with the same fields as predict_price:
+            brand, model, storage, has_5g, release_date and optionally grade and sale_date.
+
+    Returns:
+        One result per row, in the original order: the rounded price or the
+        same error dict predict_price would return for that row.
+    """
+    if hasattr(rows, "to_dict"):
+        rows = rows.to_dict("records")
+
+    results: List[Union[float, Dict[str, Any]]] = [None] * len(rows)
+    # Agrupar las filas válidas por marca: marca -> (posiciones, features)
+    batches: Dict[str, Tuple[List[int], List[List[float]]]] = {}
+
+    for i, row in enumerate(rows):
+        brand_lower, features, error = _resolve_device(row)
+        if error is not None:
+            results[i] = error
+            continue
+        positions, matrix = batches.setdefault(brand_lower, ([], []))
+        positions.append(i)
+        matrix.append(features)
+
+    for brand_lower, (positions, matrix) in batches.items():
+        # Obtener el modelo de la marca (cargado una sola vez por proceso)
+        xgb_model = MODEL_REGISTRY.get(brand_lower)
+        if xgb_model is None:
+            for i, features in zip(positions, matrix):
+                results[i] = {
+                    "error": "model_loading_failed",
+                    "message": f"Hubo un problema al cargar el modelo de predicción para {rows[i]['brand']}. Utilizaremos una estimación general.",
+                    "fallback_price": fallback_predict_price(features[2], rows[i].get("grade") or 'C')
+                }
+            continue
+
+        try:
+            prices = _predict_features(brand_lower, xgb_model, matrix)
+        except Exception as e:
+            print(f"Error during price prediction: {e}")
+            for i, features in zip(positions, matrix):
+                results[i] = _prediction_error(e, features[2], rows[i].get("grade") or 'C')
+            continue
+
+        for i, price in zip(positions, prices):
+            results[i] = price
+
+        print(f"XGBoost batch prediction for {brand_lower}: {len(positions)} devices")
+
+    return results
+
+
+def predict_price(
+    brand: str,
+    model: str,
+    storage: str,
+    has_5g: bool,
+    release_date: Union[str, date],
+    grade: str = 'C',
+    sale_date: Union[str, date] = date.today()
+) -> Union[float, Dict[str, Any]]:
+    """Predicts the selling price of a device based on its characteristics."""
+
+    print(
+        f"Predicting price for {brand} {model} ({storage}, 5G: {has_5g}, grade: {grade})")
+    print(f"Release date: {release_date}, sale date: {sale_date}")
+
+    result = predict_prices([{
+        "brand": brand,
+        "model": model,
+        "storage": storage,
+        "has_5g": has_5g,
+        "release_date": release_date,
+        "grade": grade,
+        "sale_date": sale_date,
+    }])[0]
+
+    print(f"Prediction for {brand} {model}: {result}")
+    return result
 
 
 def fallback_predict_price(fecha_lanzamiento: int, grade: str) -> float:
@@ -147,6 +242,76 @@ def fallback_predict_price(fecha_lanzamiento: int, grade: str) -> float:
     return round(final_price, 2)
 
 
+def _build_candidates(
+    brand: str,
+    today: date,
+    storage_options: List[str] = STORAGE_OPTIONS,
+    grade_options: List[str] = GRADE_OPTIONS
+) -> List[Dict[str, Any]]:
+    """Calcula el precio de venta de cada combinación (modelo, almacenamiento, grado) de una marca.
+
+    Solo se incluyen las combinaciones que el modelo de la marca ha podido predecir.
+    """
+    brand_name = brand.capitalize()
+    specs = []
+    for model in BRAND_MODEL_MAP.get(brand, []):
+        has_5g = "5G" in model
+        # Usar fecha de lanzamiento aproximada
+        release_date = get_release_date(brand_name, model) or date(2021, 1, 1)
+        for storage in storage_options:
+            for grade in grade_options:
+                specs.append({
+                    "brand": brand_name,
+                    "model": model,
+                    "storage": storage,
+                    "has_5g": has_5g,
+                    "release_date": release_date,
+                    "grade": grade,
+                    "sale_date": today,
+                })
+
+    # Aplicar margen según marca y grado
+    markups = MARKUP_BY_BRAND.get(brand, MARKUP_BY_BRAND["default"])
+
+    candidates = []
+    unpriced = 0
+    for spec, trade_in_price in zip(specs, predict_prices(specs)):
+        # Sin predicción del modelo (error o marca sin booster) no se recomienda:
+        # el precio de fallback es aleatorio y quedaría fijado en la tabla todo el día
+        if isinstance(trade_in_price, dict):
+            unpriced += 1
+            continue
+
+        # Asegurar que usamos un grado válido para el lookup
+        markup_factor = markups.get(spec["grade"], markups["C"])
+        final_price = trade_in_price * (1 + markup_factor)
+
+        candidates.append({
+            "brand": spec["brand"],
+            "model": spec["model"],
+            "storage": spec["storage"],
+            "storage_gb": _parse_storage(spec["storage"]),
+            "has_5g": spec["has_5g"],
+            "release_date": spec["release_date"],
+            "grade": spec["grade"],
+            "trade_in_price": trade_in_price,
+            "markup_factor": markup_factor,
+            "estimated_price": round(final_price, 2)  # Precio de venta estimado
+        })
+
+    if unpriced:
+        print(f"Skipped {unpriced} {brand} combinations without a model prediction")
+    return candidates
+
+
+def _recommendable_brands() -> List[str]:
+    return [brand for brand in BRAND_MODEL_MAP if brand in SUPPORTED_BRANDS]
+
+
+# Tabla de precios del día para todas las combinaciones, ordenada por precio final
+PRICE_TABLE = PriceTable(_build_candidates, _recommendable_brands)
+
+
 def recommend_device(
     budget: float, 
     brand_preference: Optional[str] = None, 
@@ -157,12 +322,11 @@ def recommend_device(
     print(f"Recommending devices within {budget}€ budget")
     print(f"Preferences: Brand={brand_preference}, Min Storage={min_storage}GB, Grade={grade_preference}")
     
-    recommended_devices = []
-    
     try:
+        brand_lower = MODEL_RESOLVER.resolve_brand(brand_preference)
+
         # Si se especificó una marca, verificar que esté soportada
-        if brand_preference:
-            brand_lower = brand_preference.lower()
+        if brand_lower:
             if brand_lower not in SUPPORTED_BRANDS:
                 return {
                     "error": "unsupported_brand",
@@ -177,132 +341,56 @@ def recommend_device(
                     "message": f"No encontramos modelos disponibles para la marca {brand_preference}.",
                     "fallback_recommendation": get_fallback_recommendation(budget, min_storage, grade_preference)
                 }
-        
-        # Preparar lista de modelos a evaluar
-        models_to_evaluate = []
-        
-        if brand_preference:
-            # Usar solo modelos de la marca preferida
-            brand_lower = brand_preference.lower()
-            if brand_lower in BRAND_MODEL_MAP:
-                for model_name in BRAND_MODEL_MAP[brand_lower]:
-                    models_to_evaluate.append((brand_preference, model_name))
-        else:
-            # Usar modelos de todas las marcas soportadas
-            for brand, models in BRAND_MODEL_MAP.items():
-                if brand.lower() in SUPPORTED_BRANDS:
-                    for model_name in models:
-                        # Extraer solo el modelo sin la marca
-                        if brand in model_name:
-                            model_only = model_name.split(brand)[1].strip()
-                        else:
-                            model_only = model_name
-                        
-                        models_to_evaluate.append((brand.capitalize(), model_only))
-        
-        if not models_to_evaluate:
+
+        brands = [brand_lower] if brand_lower else _recommendable_brands()
+        if not brands:
             return {
                 "error": "no_matching_models",
                 "message": "No encontramos modelos disponibles que coincidan con tus criterios.",
                 "fallback_recommendation": get_fallback_recommendation(budget, min_storage, grade_preference)
             }
-            
-        # Definir opciones de almacenamiento según la preferencia
-        if min_storage:
-            # Si se especificó un almacenamiento mínimo, usar ese valor exacto
-            storage_value = min_storage
-            storage_options = [f"{storage_value}GB"]
-        else:
-            # Si no se especificó almacenamiento, evaluar varias opciones comunes
-            storage_options = ["64GB", "128GB", "256GB", "512GB", "1TB"]
-        
-        # Definir opciones de grado según la preferencia
-        if grade_preference:
-            # Si se especificó un grado, usar ese valor exacto
-            grade_options = [grade_preference]
+
+        storage_in_table = not min_storage or min_storage in {
+            _parse_storage(storage) for storage in STORAGE_OPTIONS}
+        grade_in_table = not grade_preference or grade_preference in GRADE_OPTIONS
+
+        if storage_in_table and grade_in_table:
+            # Caso habitual: búsqueda binaria sobre la tabla precalculada del día
+            top_candidates = PRICE_TABLE.query(
+                budget,
+                brand=brand_lower,
+                storage_gb=min_storage or None,
+                grade=grade_preference or None,
+                limit=5
+            )
         else:
-            # Si no se especificó grado, evaluar varios grados
-            grade_options = ["B", "C", "D", "E"]
-        
-        # Fecha actual para calcular el precio
-        today = date.today()
-        
-        # Generar todas las combinaciones y calcular precios
-        candidates = []
-        
-        # Definir márgenes de precio por marca y grado
-        markup_by_brand = {
-            "apple": {"B": 0.60, "C": 0.55, "D": 0.50, "E": 0.45},  # Apple tiene márgenes más altos
-            "samsung": {"B": 0.55, "C": 0.50, "D": 0.45, "E": 0.40},
-            "xiaomi": {"B": 0.45, "C": 0.40, "D": 0.35, "E": 0.30},
-            "default": {"B": 0.50, "C": 0.45, "D": 0.40, "E": 0.35}  # Para otras marcas
-        }
-        
-        for brand, model in models_to_evaluate:
-            has_5g = "5G" in model
-            
-            # Usar fecha de lanzamiento aproximada
-            release_date = get_release_date(brand, model) or date(2021, 1, 1)
-            
-            # Para cada combinación de almacenamiento y grado
-            for storage in storage_options:
-                for grade in grade_options:
-                    # Calcular precio estimado (precio de trade-out)
-                    price_result = predict_price(brand, model, storage, has_5g, release_date, grade, today)
-                    
-                    # Manejar el caso de error en la predicción
-                    if isinstance(price_result, dict):
-                        if "fallback_price" in price_result:
-                            trade_in_price = price_result["fallback_price"]
-                        else:
-                            continue
-                    else:
-                        trade_in_price = price_result
-                    
-                    # Aplicar margen según marca y grado
-                    brand_key = brand.lower()
-                    if brand_key not in markup_by_brand:
-                        brand_key = "default"
-                        
-                    # Asegurar que usamos un grado válido para el lookup
-                    grade_key = grade if grade in markup_by_brand[brand_key] else "C"
-                    
-                    # Obtener el margen de markup y calcular el precio final
-                    markup_factor = markup_by_brand[brand_key][grade_key]
-                    final_price = trade_in_price * (1 + markup_factor)
-                    
-                    # Si está dentro del presupuesto, añadir a candidatos
-                    if final_price <= budget:
-                        candidates.append({
-                            "brand": brand,
-                            "model": model,
-                            "storage": storage,
-                            "has_5g": has_5g,
-                            "release_date": release_date,
-                            "grade": grade,
-                            "trade_in_price": trade_in_price,
-                            "markup_factor": markup_factor,
-                            "estimated_price": round(final_price, 2)  # Precio de venta estimado
-                        })
-        
-        # Ordenar los candidatos por precio descendente (maximizar el presupuesto)
-        candidates.sort(key=lambda x: x["estimated_price"], reverse=True)
-        
-        # Limitar a los 5 mejores resultados
-        top_candidates = candidates[:5]
+            # Preferencias fuera de la tabla: calcular solo las combinaciones pedidas
+            storage_options = [f"{min_storage}GB"] if min_storage else STORAGE_OPTIONS
+            grade_options = [grade_preference] if grade_preference else GRADE_OPTIONS
+            today = date.today()
+            candidates = [
+                candidate
+                for brand in brands
+                for candidate in _build_candidates(brand, today, storage_options, grade_options)
+                if candidate["estimated_price"] <= budget
+            ]
+            # Ordenar los candidatos por precio descendente (maximizar el presupuesto)
+            candidates.sort(key=lambda x: x["estimated_price"], reverse=True)
+            top_candidates = candidates[:5]
         
         # Convertir a DeviceInfo
-        for candidate in top_candidates:
-            device = DeviceInfo(
-                brand=candidate["brand"],
+        recommended_devices = [
+            DeviceInfo(
+                brand=brand_preference or candidate["brand"],
                 model=candidate["model"],
-                storage=candidate["storage"],
+                storage=f"{min_storage}GB" if min_storage else candidate["storage"],
                 has_5g=candidate["has_5g"],
                 release_date=candidate["release_date"],
                 grade=candidate["grade"],
                 estimated_price=candidate["estimated_price"]
             )
-            recommended_devices.append(device)
+            for candidate in top_candidates
+        ]
         
         # Si no hay recomendaciones, proporcionar un fallback
         if not recommended_devices:
@@ -394,101 +482,100 @@ def get_release_date(brand: str, model: str, has_5g: bool = False) -> Optional[d
     Returns:
         The release date if found in CSV or hardcoded data, or a default date
     """
-    import pandas as pd
-    import os
-    from datetime import datetime
-    
     print(f"Getting release date for {brand} {model} (5G: {has_5g})")
-    
-    # Intentar cargar las fechas desde el CSV primero
-    try:
-        csv_path = os.path.join(DATA_DIR, "Fecha_Lanzamiento.csv")
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path, sep=";")
-            
-            # Preparar el modelo para búsqueda
-            if has_5g and "5G" not in model:
-                model_with_5g = f"{model} 5G"
-            else:
-                model_with_5g = None
-            
-            # En el CSV, el formato es: "Marca Modelo"
-            full_name = f"{brand} {model}"
-            
-            # Intentar encontrar coincidencias directas
-            for search_term in [full_name, model_with_5g, f"{brand} {model_with_5g}"]:
-                if not search_term:
-                    continue
-                
-                matches = df[df['Modelo'].str.lower() == search_term.lower()]
-                if not matches.empty:
-                    date_str = matches.iloc[0]['Fecha de Lanzamiento']
-                    return datetime.strptime(date_str.split()[0], '%Y-%m-%d').date()
-            
-            # Búsqueda parcial si no hay coincidencias exactas
-            for idx, row in df.iterrows():
-                db_model = row['Modelo'].lower()
-                if (model.lower() in db_model) or (full_name.lower() in db_model):
-                    date_str = row['Fecha de Lanzamiento']
-                    return datetime.strptime(date_str.split()[0], '%Y-%m-%d').date()
-                
-                # Intentar con versión 5G si aplica
-                if model_with_5g and model_with_5g.lower() in db_model:
-                    date_str = row['Fecha de Lanzamiento']
-                    return datetime.strptime(date_str.split()[0], '%Y-%m-%d').date()
-    
-    except Exception as e:
-        print(f"Error loading release dates from CSV: {e}")
-    
-    # Si no se encuentra en CSV o hay error, usar el método anterior con datos hardcodeados
-    release_dates = {
-        # Apple
-        ("Apple", "iPhone 15"): date(2023, 9, 22),
-        ("Apple", "iPhone 14"): date(2022, 9, 16),
-        ("Apple", "iPhone 13"): date(2021, 9, 24),
-        ("Apple", "iPhone 12"): date(2020, 10, 23),
-        ("Apple", "iPhone 11"): date(2019, 9, 20),
-        ("Apple", "iPhone XS"): date(2018, 9, 21),
-        ("Apple", "iPhone X"): date(2017, 11, 3),
-        ("Apple", "iPhone 8"): date(2017, 9, 22),
-        ("Apple", "iPhone 7"): date(2016, 9, 16),
-        
-        # Samsung
-        ("Samsung", "Galaxy S24"): date(2024, 1, 31),
-        ("Samsung", "Galaxy S23"): date(2023, 2, 17),
-        ("Samsung", "Galaxy S22"): date(2022, 2, 25),
-        ("Samsung", "Galaxy S21"): date(2021, 1, 29),
-        ("Samsung", "Galaxy S20"): date(2020, 3, 6),
-        ("Samsung", "Galaxy A53"): date(2022, 3, 25),
-        ("Samsung", "Galaxy A13"): date(2022, 3, 23),
-        ("Samsung", "Galaxy A12"): date(2021, 1, 7),
-        
-        # Xiaomi
-        ("Xiaomi", "13 Pro"): date(2023, 2, 26),
-        ("Xiaomi", "12 Pro"): date(2022, 3, 15),
-        ("Xiaomi", "11T Pro"): date(2021, 9, 23),
-        ("Xiaomi", "Redmi Note 12"): date(2022, 10, 27),
-        ("Xiaomi", "Redmi Note 11"): date(2022, 1, 26),
-        ("Xiaomi", "Redmi Note 10"): date(2021, 3, 16),
-        ("Xiaomi", "Redmi 10C"): date(2022, 3, 29),
-    }
-    
-    # Intentar encontrar coincidencia exacta en datos hardcodeados
-    key = (brand, model)
-    if key in release_dates:
-        return release_dates[key]
-    
-    # Intentar buscar coincidencia parcial
-    for (b, m), date_value in release_dates.items():
-        if b.lower() == brand.lower() and m in model:
-            return date_value
-    
+
+    # Buscar primero en las fechas cargadas del CSV
+    release_date = RELEASE_DATE_INDEX.lookup(brand, model, has_5g)
+    if release_date:
+        return release_date
+
+    # Probar con el nombre de referencia ("Apple iPhone 13" -> "iPhone 13")
+    match = MODEL_RESOLVER.resolve(model, brand, has_5g)
+    if match and match.name != model:
+        release_date = RELEASE_DATE_INDEX.lookup(brand, match.name)
+        if release_date:
+            return release_date
+
+    # Si no se encuentra en CSV, usar los datos hardcodeados
+    release_date = hardcoded_release_date(brand, model)
+    if release_date:
+        return release_date
+
     # Fecha por defecto para modelos desconocidos: 2 años atrás
     today = date.today()
     default_date = date(today.year - 2, today.month, today.day)
     return default_date
 
 
+def predict_price_curve(
+    brand: str,
+    model: str,
+    storage: str,
+    has_5g: bool,
+    release_date: Union[str, date],
+    grade: str,
+    sale_dates: List[Union[str, date]]
+) -> List[Union[float, Dict[str, Any]]]:
+    """Predice el precio de un mismo dispositivo en varias fechas con una sola llamada al modelo.
+
+    El dispositivo se resuelve una vez y solo varía la columna de días desde
+    el lanzamiento. Si no se puede usar XGBoost, cada punto recibe el mismo
+    resultado de error que daría predict_price.
+    """
+    release_date = parse_date(release_date)
+    sale_dates = [parse_date(sale_date) for sale_date in sale_dates]
+    rows = [{
+        "brand": brand,
+        "model": model,
+        "storage": storage,
+        "has_5g": has_5g,
+        "release_date": release_date,
+        "grade": grade,
+        "sale_date": sale_date,
+    } for sale_date in sale_dates]
+
+    if not rows:
+        return []
+
+    brand_lower, features, error = _resolve_device({**rows[0], "sale_date": release_date})
+    xgb_model = MODEL_REGISTRY.get(brand_lower) if error is None else None
+    if xgb_model is None:
+        return predict_prices(rows)
+
+    # Una fila por fecha: solo cambian los días desde el lanzamiento
+    matrix = [
+        [features[0], features[1], max(0, (sale_date - release_date).days), features[3]]
+        for sale_date in sale_dates
+    ]
+
+    try:
+        prices = _predict_features(brand_lower, xgb_model, matrix)
+    except Exception as e:
+        print(f"Error during price prediction: {e}")
+        return [_prediction_error(e, days, grade) for _, _, days, _ in matrix]
+
+    print(f"XGBoost curve prediction for {brand} {model}: {len(sale_dates)} points")
+    return prices
+
+
+def build_date_range(
+    start_date: Union[str, date],
+    end_date: Union[str, date],
+    step_days: int = 30
+) -> List[str]:
+    """Genera las fechas entre start_date y end_date (incluidas) en formato DD-MM-YYYY."""
+    start_date = parse_date(start_date)
+    end_date = parse_date(end_date)
+    step = timedelta(days=max(1, step_days))
+
+    dates = []
+    current = start_date
+    while current <= end_date:
+        dates.append(current.strftime("%d-%m-%Y"))
+        current += step
+    return dates
+
+
 def generate_graphic_dict(
         brand: str,
         model: str,
@@ -496,16 +583,25 @@ def generate_graphic_dict(
         has_5g: bool,
         release_date: Union[str, date],
         grade: str,
-        date_range: list) -> dict:
-    """Generates a dictionary of date-price pairs for a graphic based on device info and grade."""
+        date_range: Optional[list] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        step_days: int = 30) -> dict:
+    """Generates a dictionary of date-price pairs for a graphic based on device info and grade.
+
+    Dates can be given explicitly in date_range (DD-MM-YYYY) or as a
+    start_date/end_date range sampled every step_days days (1 for daily points).
+    """
     print(
         f"Generating graphic for {brand} {model} ({storage}, 5G: {has_5g}, grade: {grade})")
 
-    graphic_data = {}
-    for date in date_range:
-        price = predict_price(brand, model, storage,
-                              has_5g, release_date, grade, date)
-        graphic_data[date] = price
+    if not date_range and start_date and end_date:
+        date_range = build_date_range(start_date, end_date, step_days)
+    date_range = date_range or []
+
+    prices = predict_price_curve(brand, model, storage, has_5g,
+                                 release_date, grade, date_range)
+    graphic_data = dict(zip(date_range, prices))
 
     tool_result = {
         "graph_data": graphic_data,
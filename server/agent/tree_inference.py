@@ -0,0 +1,191 @@
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Objetivos cuya predicción es directamente la suma de las hojas (sin función de enlace)
+IDENTITY_OBJECTIVES = {
+    "reg:squarederror",
+    "reg:squaredlogerror",
+    "reg:absoluteerror",
+    "reg:pseudohubererror",
+    "reg:quantileerror",
+    "reg:linear",
+}
+
+
+def _parse_float(value) -> float:
+    # Según la versión de XGBoost base_score se guarda como "5E-1" o "[5E-1]"
+    return float(str(value).strip("[]"))
+
+
+class FlatTreeEnsemble:
+    """Evaluador en NumPy de un booster de XGBoost (gbtree, regresión).
+
+    Todos los árboles se aplanan en arrays contiguos (feature, umbral, hijo
+    izquierdo/derecho, rama por defecto y valor de hoja) y se recorren a la
+    vez para todas las filas, un nivel de profundidad por iteración. Evita
+    el DMatrix y las validaciones del wrapper de sklearn, que dominan el
+    tiempo en las predicciones de pocas filas.
+    """
+
+    def __init__(self, model_json: Dict[str, Any], max_trees: int = None):
+        learner = model_json["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in IDENTITY_OBJECTIVES:
+            raise NotImplementedError(f"Objective {objective} not supported")
+        params = learner["learner_model_param"]
+        if int(params.get("num_class", 0)) > 1 or int(params.get("num_target", 1)) > 1:
+            raise NotImplementedError("Multi-output models not supported")
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree":
+            raise NotImplementedError(f"Booster {booster['name']} not supported")
+
+        trees = booster["model"]["trees"]
+        if max_trees is not None:
+            trees = trees[:max_trees]
+
+        self.base_score = np.float32(_parse_float(params["base_score"]))
+        self.num_features = int(params["num_feature"])
+
+        roots: List[int] = []
+        left, feature, threshold, default_left, value = [], [], [], [], []
+        max_depth = 0
+        for tree in trees:
+            if any(tree.get("split_type", [])):
+                raise NotImplementedError("Categorical splits not supported")
+            roots.append(len(left))
+            max_depth = max(max_depth, self._flatten(tree, left, feature, threshold, default_left, value))
+
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.max_depth = max_depth
+
+    @staticmethod
+    def _flatten(tree, left, feature, threshold, default_left, value) -> int:
+        """Añade los nodos del árbol a los arrays y devuelve su profundidad.
+
+        Los nodos se renumeran para que los dos hijos queden seguidos (el
+        derecho es left + 1) y así bajar un nivel es left[nodo] + (no va a la
+        izquierda). Las hojas apuntan a sí mismas con umbral infinito, de modo
+        que el recorrido se queda en ellas.
+        """
+        tree_left = tree["left_children"]
+        tree_right = tree["right_children"]
+        offset = len(left)
+        # Orden en anchura: nodo original y profundidad de cada posición nueva
+        order = [(0, 0)]
+        position = 0
+        max_depth = 0
+        while position < len(order):
+            node, depth = order[position]
+            new_id = offset + position
+            if tree_left[node] == -1:
+                left.append(new_id)
+                feature.append(0)
+                threshold.append(np.inf)
+                default_left.append(True)
+                # En los nodos hoja split_conditions guarda el valor de la hoja
+                value.append(tree["split_conditions"][node])
+            else:
+                left.append(offset + len(order))
+                order.append((tree_left[node], depth + 1))
+                order.append((tree_right[node], depth + 1))
+                feature.append(tree["split_indices"][node])
+                threshold.append(tree["split_conditions"][node])
+                default_left.append(bool(tree["default_left"][node]))
+                value.append(0.0)
+                max_depth = max(max_depth, depth + 1)
+            position += 1
+        return max_depth
+
+    @classmethod
+    def from_xgboost(cls, model) -> "FlatTreeEnsemble":
+        """Aplana un XGBRegressor o un Booster ya cargado."""
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        best_iteration = booster.attr("best_iteration")
+        model_json = json.loads(booster.save_raw(raw_format="json"))
+        max_trees = None
+        if best_iteration is not None:
+            # Igual que XGBRegressor.predict: solo los árboles hasta la mejor iteración
+            indptr = model_json["learner"]["gradient_booster"]["model"].get("iteration_indptr")
+            max_trees = indptr[int(best_iteration) + 1] if indptr else int(best_iteration) + 1
+        return cls(model_json, max_trees)
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(array.nbytes for array in (
+            self.roots, self.left, self.feature,
+            self.threshold, self.default_left, self.value))
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.num_features:
+            raise ValueError(f"Expected {self.num_features} features, got {X.shape[1]}")
+
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        has_missing = bool(np.isnan(flat).any())
+        # Posición en X.ravel() del inicio de la fila de cada par (fila, árbol)
+        row_starts = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, self.num_trees)
+        nodes = np.tile(self.roots, n_rows)
+        for _ in range(self.max_depth):
+            values = flat.take(row_starts + self.feature.take(nodes))
+            # Como XGBoost: a la izquierda si el valor es menor que el umbral, NaN por la rama por defecto
+            go_left = values < self.threshold.take(nodes)
+            if has_missing:
+                go_left |= np.isnan(values) & self.default_left.take(nodes)
+            nodes = self.left.take(nodes) + ~go_left
+
+        # Suma secuencial en float32, árbol a árbol, partiendo de base_score como XGBoost
+        leaves = np.empty((n_rows, self.num_trees + 1), dtype=np.float32)
+        leaves[:, 0] = self.base_score
+        leaves[:, 1:] = self.value.take(nodes).reshape(n_rows, self.num_trees)
+        return np.cumsum(leaves, axis=1, dtype=np.float32)[:, -1]
+
+
+class CompiledModel:
+    """XGBRegressor con el evaluador aplanado delante.
+
+    Los lotes de hasta max_rows filas (las llamadas de predict_price y las
+    curvas) se evalúan con FlatTreeEnsemble; los más grandes, donde el
+    predictor multihilo de XGBoost es más rápido, van al modelo original.
+    """
+
+    def __init__(self, model, ensemble: FlatTreeEnsemble, max_rows: int):
+        self.model = model
+        self.ensemble = ensemble
+        self.max_rows = max_rows
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 2 and len(X) > self.max_rows:
+            return self.model.predict(X)
+        return self.ensemble.predict(X)
+
+    def get_booster(self):
+        return self.model.get_booster()
+
+
+def compile_model(model, backend: str, max_rows: int):
+    """Devuelve el modelo preparado para el backend indicado ("xgboost" o "numpy").
+
+    Si el booster usa algo que el evaluador no soporta se sigue usando XGBoost.
+    """
+    if backend != "numpy":
+        return model
+    try:
+        return CompiledModel(model, FlatTreeEnsemble.from_xgboost(model), max_rows)
+    except (NotImplementedError, KeyError, ValueError) as e:
+        print(f"Could not compile model for NumPy inference, using XGBoost: {e}")
+        return model
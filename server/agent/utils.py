@@ -1,28 +1,55 @@
 import json
-from typing import Union
-from langchain.schema import SystemMessage, BaseMessage
+from collections import Counter
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+from langchain_core.messages import SystemMessage, BaseMessage
 from datetime import date, datetime
 import xgboost as xgb
-import pandas as pd
 import unicodedata
 
-from .constants import DATA_DIR, MODELS_DIR, SUPPORTED_BRANDS
+from .constants import MODELS_DIR, SUPPORTED_BRANDS
+from .reference_bundle import load_reference_data
 from .agent_state import State
 from .models import BuyingInfo, DeviceInfo
-from .prompts import BASE_PROMPT, BUYING_INFO_EXTRACT_PROMPT, BUYING_PROMPT, GRADING_BASE_PROMPT, GRAPHIC_INTENT_PROMPT, SELL_INTENT_PROMPT, SELLING_PROMPT, BASIC_INFO_EXTRACTION_PROMPT, DETECT_INTENT_PROMPT
+from .prompts import BASE_PROMPT, BUYING_INFO_EXTRACT_PROMPT, BUYING_PROMPT, GRADING_BASE_PROMPT, GRAPHIC_INTENT_PROMPT, SELL_INTENT_PROMPT, SELLING_PROMPT, BASIC_INFO_EXTRACTION_PROMPT, DETECT_INTENT_PROMPT, INCREMENTAL_EXTRACTION_CONTEXT
 
 
-def extract_selling_info(state, llm) -> DeviceInfo:
-    # Obtener la información existente del state
-    current_info = state.device_info if hasattr(
-        state, 'device_info') else DeviceInfo()
+# Campos que se extraen de forma incremental entre turnos
+DEVICE_INFO_FIELDS = ["brand", "model", "storage", "has_5g", "release_date"]
+BUYING_INFO_FIELDS = ["budget", "brand_preference", "min_storage", "grade_preference"]
+
 
-    # Extraer solo el contenido de los mensajes del usuario
+def build_extraction_context(current_info, messages, fields) -> str:
+    """Texto a analizar: la información ya extraída más los mensajes nuevos."""
     conversation_text = "\n".join([
         f"Usuario: {msg.content}" if msg.type == "human" else f"Asistente: {msg.content}"
-        for msg in state["messages"]
+        for msg in messages if msg.content
     ])
 
+    current_values = {
+        field: value for field, value in current_info.model_dump(mode="json").items()
+        if field in fields and value not in (None, "")
+    } if current_info else {}
+    if not current_values:
+        return conversation_text
+
+    return INCREMENTAL_EXTRACTION_CONTEXT.format(
+        current_info=json.dumps(current_values, ensure_ascii=False),
+        messages=conversation_text)
+
+
+def extract_selling_info(state, llm, messages=None) -> DeviceInfo:
+    """Extrae la información del dispositivo a vender.
+
+    Si se pasan ``messages`` solo se analizan esos mensajes junto con la
+    información ya extraída, en lugar de toda la conversación.
+    """
+    # Obtener la información existente del state
+    current_info = state.get("device_info") or DeviceInfo()
+
+    conversation_text = build_extraction_context(
+        current_info, state["messages"] if messages is None else messages, DEVICE_INFO_FIELDS)
+
     result = llm.invoke([
         SystemMessage(content=BASIC_INFO_EXTRACTION_PROMPT.format(
             conversation=conversation_text))
@@ -46,35 +73,21 @@ def extract_selling_info(state, llm) -> DeviceInfo:
             print("Contenido del resultado:", cleaned_content)
             return current_info or DeviceInfo()
 
-        # Preservar datos existentes que no sean vacíos
+        # Los valores nuevos no vacíos corrigen a los guardados; el resto se conserva
         if current_info:
-            # Preservar brand si existe
-            if current_info.brand:
-                result_dict['brand'] = current_info.brand
-
-            # Preservar model si existe
-            if current_info.model:
-                result_dict['model'] = current_info.model
-
-            # Preservar storage si existe
-            if current_info.storage:
-                result_dict['storage'] = current_info.storage
-
-            # Preservar has_5g si existe
-            if current_info.has_5g is not None:
-                result_dict['has_5g'] = current_info.has_5g
-
-            # Preservar release_date si existe
-            if current_info.release_date:
-                result_dict['release_date'] = current_info.release_date
+            # Con otro dispositivo no se arrastran los datos del anterior
+            same_device = not result_dict.get('model') or result_dict.get('model') == current_info.model
+            for field in DEVICE_INFO_FIELDS:
+                if same_device and result_dict.get(field) in (None, ""):
+                    result_dict[field] = getattr(current_info, field)
 
         # Asegurar que los campos string no sean None
         result_dict['brand'] = result_dict.get('brand') or ""
         result_dict['model'] = result_dict.get('model') or ""
         result_dict['storage'] = result_dict.get('storage') or ""
 
-        # Procesar fecha si existe y no había una fecha válida previamente
-        if result_dict.get('release_date') and not current_info.release_date:
+        # Procesar la fecha si viene del LLM como texto
+        if result_dict.get('release_date'):
             try:
                 date_str = result_dict['release_date']
                 if isinstance(date_str, str):
@@ -101,14 +114,12 @@ def extract_selling_info(state, llm) -> DeviceInfo:
         return current_info or DeviceInfo()
 
 
-def extract_buying_info(state, llm) -> BuyingInfo:
-    current_info = state.buying_info if hasattr(
-        state, 'buying_info') else BuyingInfo()
+def extract_buying_info(state, llm, messages=None) -> BuyingInfo:
+    """Extrae las preferencias de compra, opcionalmente solo de los mensajes nuevos."""
+    current_info = state.get("buying_info") or BuyingInfo()
 
-    conversation_text = "\n".join([
-        f"Usuario: {msg.content}" if msg.type == "human" else f"Asistente: {msg.content}"
-        for msg in state["messages"]
-    ])
+    conversation_text = build_extraction_context(
+        current_info, state["messages"] if messages is None else messages, BUYING_INFO_FIELDS)
 
     result = llm.invoke([
         SystemMessage(content=BUYING_INFO_EXTRACT_PROMPT.format(
@@ -119,23 +130,11 @@ def extract_buying_info(state, llm) -> BuyingInfo:
         cleaned_content = result.content.strip()
         result_dict = json.loads(cleaned_content)
 
-        # Preservar datos existentes que no sean vacíos
+        # Los valores nuevos no vacíos corrigen a los guardados; el resto se conserva
         if current_info:
-            # Preservar budget si existe
-            if current_info.budget:
-                result_dict['budget'] = current_info.budget
-
-            # Preservar brand_preference si existe
-            if current_info.brand_preference:
-                result_dict['brand_preference'] = current_info.brand_preference
-
-            # Preservar min_storage si existe
-            if current_info.min_storage:
-                result_dict['min_storage'] = current_info.min_storage
-
-            # Preservar grade_preference si existe
-            if current_info.grade_preference:
-                result_dict['grade_preference'] = current_info.grade_preference
+            for field in BUYING_INFO_FIELDS:
+                if result_dict.get(field) in (None, ""):
+                    result_dict[field] = getattr(current_info, field)
 
         # Asegurar que los campos string no sean None
         result_dict['brand_preference'] = result_dict.get(
@@ -149,7 +148,7 @@ def extract_buying_info(state, llm) -> BuyingInfo:
         print(f"Error al decodificar JSON: {e}")
         print("Contenido del resultado:", cleaned_content)
         # En caso de error, devolver la información existente
-        return BuyingInfo()
+        return current_info
 
 
 def build_prompt(state: State) -> SystemMessage:
@@ -312,39 +311,42 @@ def verify_intent_change(state: State, new_intent: str, llm) -> float:
         print(f"Could not parse confidence value from: '{result.content}'")
         return 0.5  # Valor medio por defecto en caso de error
 
-# Cargar el dataframe de referencia de modelos
+# Datos de referencia: el bundle de build_reference_bundle.py o, si no está, los CSV.
+# Se leen una sola vez para los tres cargadores.
+
+
+@lru_cache(maxsize=1)
+def _reference_data():
+    return load_reference_data()
 
 
 def load_model_reference():
     try:
-        df = pd.read_csv(DATA_DIR / "Modelo_REF.csv", sep=';')
-        # Crear un diccionario para mapear nombre de modelo a ID
-        model_mapping = dict(zip(df['Modelo'], df['Modelo_NUM']))
-        return model_mapping
+        # Diccionario para mapear nombre de modelo a ID
+        return dict(_reference_data().model_reference)
     except Exception as e:
         print(f"Error loading model reference data: {e}")
         return {}
 
-# Cargar el mapeo de marcas y modelos
-
 
 def load_brand_model_reference():
     try:
-        df = pd.read_csv(DATA_DIR / "Marca_Modelo_REF.csv", sep=';')
-        # Agrupar modelos por marca
-        brand_models = {}
-        for _, row in df.iterrows():
-            brand = row['Marca'].lower()
-            model = row['Modelo']
-            if brand not in brand_models:
-                brand_models[brand] = []
-            brand_models[brand].append(model)
-        return brand_models
+        # Modelos agrupados por marca (en minúsculas)
+        return {brand: list(models) for brand, models in _reference_data().brand_models.items()}
     except Exception as e:
         print(f"Error loading brand-model reference data: {e}")
         return {}
 
 
+def load_release_dates():
+    try:
+        # Lista de (modelo, fecha) en el orden del CSV
+        return list(_reference_data().release_dates)
+    except Exception as e:
+        print(f"Error loading release dates from CSV: {e}")
+        return []
+
+
 # Cargar el modelo XGBoost para una marca específica
 def load_xgboost_model(brand: str):
     try:
@@ -380,6 +382,88 @@ def normalize_text(text):
     return text_without_accents.lower()
 
 
+# Categorías de palabras clave por intención (normalizadas, sin acentos)
+INTENT_KEYWORDS = {
+    intent: [normalize_text(keyword) for keyword in keywords]
+    for intent, keywords in {
+        "buy": ["comprar", "compro", "adquirir", "recomendar", "busco", "quiero comprar",
+                "presupuesto", "cuanto cuesta", "opciones", "modelos", "recomendacion"],
+        "sell": ["vender", "vendo", "cuanto me dan", "cuanto me darian", "tasar", "precio de mi", "valor de mi"],
+        "graphic": ["grafica", "evolucion", "depreciacion", "cambio de precio",
+                    "historico", "tendencia"]
+    }.items()
+}
+
+# Frases indicadoras de cambio explícito
+CHANGE_PHRASES = [normalize_text(phrase) for phrase in [
+    "mejor quiero", "en realidad", "he cambiado de", "prefiero",
+    "ahora quiero", "pensandolo mejor", "al final", "en vez de eso",
+    "mejor dicho", "olvidalo", "dejando eso de lado", "cambiando de tema"
+]]
+
+# Inicios de pregunta que pueden indicar un tema nuevo
+QUESTION_STARTERS = ["puedo", "puedes", "podrias", "como", "cuanto", "que", "cual"]
+
+# Palabras que fuerzan a revisar la intención con el LLM aunque no haya palabras clave
+FORCE_CHECK_KEYWORDS = ["ahora", "entonces", "por otro lado", "cambiando de tema"]
+
+# Frases de precio genéricas: junto a una palabra clave de gráfica se refieren a la gráfica
+GENERIC_PRICE_PHRASES = {normalize_text(phrase) for phrase in ["precio de mi", "valor de mi", "cuanto cuesta"]}
+
+# Contadores de decisiones de intención, para ajustar INTENT_RULE_THRESHOLD
+INTENT_STATS = Counter()
+
+
+def classify_intent_rules(state: State) -> Tuple[Optional[str], float]:
+    """Clasifica la intención del último mensaje con palabras clave.
+
+    Devuelve la intención más probable y una confianza entre 0 y 1. Una
+    confianza de 0 indica que las reglas no permiten decidir: mensajes sin
+    palabras clave o con un indicio de cambio de tema, que decide el LLM.
+    """
+    message = normalize_text(state["messages"][-1].content)
+    current_intent = state.get("intent")
+
+    # Con un posible cambio de tema las palabras clave no bastan para decidir
+    if any(phrase in message for phrase in CHANGE_PHRASES) or \
+            any(keyword in message for keyword in FORCE_CHECK_KEYWORDS):
+        return None, 0.0
+
+    matched = {
+        intent: [keyword for keyword in keywords if keyword in message]
+        for intent, keywords in INTENT_KEYWORDS.items()
+    }
+    if matched["graphic"]:
+        matched = {
+            intent: [keyword for keyword in keywords if keyword not in GENERIC_PRICE_PHRASES]
+            for intent, keywords in matched.items()
+        }
+    # Las frases de varias palabras son más específicas y puntúan más
+    scores = {
+        intent: sum(1 + 0.5 * keyword.count(" ") for keyword in keywords)
+        for intent, keywords in matched.items()
+    }
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best_intent, best_score), (_, second_score) = ranked[0], ranked[1]
+
+    if best_score == 0:
+        # Sin palabras clave no se puede saber si la intención sigue siendo la misma
+        return None, 0.0
+
+    margin = best_score - second_score
+    if margin <= 0:
+        # Empate entre intenciones: caso ambiguo
+        return None, 0.0
+
+    confidence = 0.55 + 0.2 * margin
+    if best_intent == current_intent:
+        confidence += 0.1
+    elif current_intent and current_intent != "none":
+        # Cambiar de intención exige más evidencia
+        confidence -= 0.1
+    return best_intent, min(0.95, confidence)
+
+
 def intent_change_potential(state: State) -> bool:
     """Determina si el último mensaje del usuario sugiere un cambio de intención."""
     # Si no hay mensajes suficientes o no hay intención establecida, siempre retornar True
@@ -390,47 +474,19 @@ def intent_change_potential(state: State) -> bool:
     # Normalizar el mensaje (quitar acentos)
     normalized_message = normalize_text(last_message)
 
-    # Categorías de palabras clave por intención
-    intent_keywords = {
-        "buy": ["comprar", "compro", "adquirir", "recomendar", "busco", "quiero comprar",
-                "presupuesto", "cuanto cuesta", "opciones", "modelos", "recomendacion"],
-        "sell": ["vender", "vendo", "cuanto me dan", "tasar", "precio de mi", "valor de mi"],
-        "graphic": ["grafica", "evolucion", "depreciacion", "cambio de precio",
-                    "historico", "tendencia"]
-    }
-
-    # Normalizar todas las palabras clave (quitar acentos)
-    normalized_intent_keywords = {}
-    for intent, keywords in intent_keywords.items():
-        normalized_intent_keywords[intent] = [
-            normalize_text(keyword) for keyword in keywords]
-
-    # Frases indicadoras de cambio explícito
-    change_phrases = [
-        "mejor quiero", "en realidad", "he cambiado de", "prefiero",
-        "ahora quiero", "pensandolo mejor", "al final", "en vez de eso",
-        "mejor dicho", "olvidalo", "dejando eso de lado", "cambiando de tema"
-    ]
-
-    # Normalizar frases de cambio (quitar acentos)
-    normalized_change_phrases = [normalize_text(
-        phrase) for phrase in change_phrases]
-
     # Verificar cambio explícito
-    if any(phrase in normalized_message for phrase in normalized_change_phrases):
+    if any(phrase in normalized_message for phrase in CHANGE_PHRASES):
         return True
 
     # Verificar si hay palabras clave de una intención diferente a la actual
     current_intent = state.get("intent", "none")
-    for intent, keywords in normalized_intent_keywords.items():
+    for intent, keywords in INTENT_KEYWORDS.items():
         # Si detectamos palabras clave de otra intención
         if intent != current_intent and any(word in normalized_message for word in keywords):
             return True
 
     # Análisis sintáctico básico para detectar preguntas nuevas (también normalizado)
-    question_starters = ["puedo", "puedes",
-                         "podrias", "como", "cuanto", "que", "cual"]
-    if any(normalized_message.startswith(starter) for starter in question_starters):
+    if any(normalized_message.startswith(starter) for starter in QUESTION_STARTERS):
         # Verificar si la pregunta indica una nueva intención
         return True
 
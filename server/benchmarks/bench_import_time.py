@@ -0,0 +1,85 @@
+"""Informe del tiempo de importación de main.py (arranque en frío del servidor).
+
+Uso (desde server/):
+    python benchmarks/bench_import_time.py [--top 15] [--update]
+
+Ejecuta `python -X importtime -c "import main"` en un proceso nuevo y muestra
+el tiempo total y los módulos que más tardan, comparados con la línea base de
+benchmarks/import_time_baseline.json (--update la reescribe). Termina con
+error si main.py vuelve a importar alguno de los módulos pesados que deben
+cargarse en el warm-up.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "import_time_baseline.json"
+
+# Módulos que solo deben cargarse en el warm-up o en el primer uso
+HEAVY_MODULES = ["agent.main", "agent.tools", "xgboost", "pandas", "sklearn", "langchain_openai", "langgraph.graph"]
+
+
+def run_importtime():
+    """Devuelve {módulo: (µs propios, µs acumulados)} de importar main."""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Error importing main:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--update", action="store_true", help="guardar este resultado como línea base")
+    args = parser.parse_args()
+
+    modules = run_importtime()
+    total_ms = modules["main"][1] / 1000
+    top = sorted(
+        ((name, cumulative / 1000) for name, (_, cumulative) in modules.items()
+         if name != "main" and "." not in name),
+        key=lambda item: item[1], reverse=True)[:args.top]
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    baseline_modules = baseline.get("modules", {})
+
+    print(f"import main: {total_ms:.0f} ms", end="")
+    if baseline:
+        print(f" (línea base {baseline['total_ms']:.0f} ms)")
+    else:
+        print()
+    print(f"\n{'paquete':>24} {'ms':>8} {'base (ms)':>10}")
+    for name, cumulative_ms in top:
+        base = baseline_modules.get(name)
+        print(f"{name:>24} {cumulative_ms:>8.0f} {base if base is not None else '-':>10}")
+
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps({
+            "total_ms": round(total_ms),
+            "modules": {name: round(cumulative_ms) for name, cumulative_ms in top},
+        }, indent=2) + "\n")
+        print(f"\nLínea base guardada en {BASELINE_PATH.name}")
+
+    heavy = [name for name in HEAVY_MODULES if name in modules]
+    if heavy:
+        sys.exit(f"\nmain.py importa módulos pesados al arrancar: {', '.join(heavy)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compara la búsqueda exacta de modelos con ModelResolver.
+
+Uso (desde server/):
+    python benchmarks/bench_model_resolver.py [--repeat 200]
+
+Genera variantes de cada nombre de Modelo_REF.csv tal como las escriben los
+usuarios (mayúsculas, marca delante, sin espacios, una errata) y mide cuántas
+resuelve cada búsqueda al modelo correcto y cuánto tarda ModelResolver.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.model_resolver import ModelResolver  # noqa: E402
+from agent.utils import load_brand_model_reference, load_model_reference  # noqa: E402
+
+
+# Búsqueda anterior, copiada tal cual como referencia
+def legacy_find_model_id(model_reference, model, has_5g):
+    model_with_5g = f"{model} 5G" if has_5g and "5G" not in model else model
+    model_without_5g = model.replace(" 5G", "") if "5G" in model else model
+    if has_5g and model_with_5g in model_reference:
+        return model_reference[model_with_5g], model_with_5g
+    if model_without_5g in model_reference:
+        return model_reference[model_without_5g], model_without_5g
+    return None, None
+
+
+def with_typo(name: str) -> str:
+    """Intercambia dos letras seguidas de la palabra más larga."""
+    words = name.split(" ")
+    longest = max(range(len(words)), key=lambda i: len(words[i]))
+    word = words[longest]
+    if len(word) < 4 or not word.isalpha():
+        return name
+    words[longest] = word[:1] + word[2] + word[1] + word[3:]
+    return " ".join(words)
+
+
+def variants(name: str, brand: str):
+    yield "exacto", name
+    yield "minúsculas", name.lower()
+    if not name.lower().startswith(brand):
+        yield "con marca", f"{brand.capitalize()} {name}"
+    yield "sin espacios", name.replace(" ", "", 1)
+    typo = with_typo(name)
+    if typo != name:
+        yield "errata", typo
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    model_reference = load_model_reference()
+    brand_models = load_brand_model_reference()
+    start = time.perf_counter()
+    resolver = ModelResolver(model_reference, brand_models)
+    print(f"Índice construido en {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({len(resolver)} modelos, {resolver.stats()['keys']} claves)\n")
+
+    results = {}
+    latencies = []
+    for brand, models in brand_models.items():
+        for name in models:
+            has_5g = name.endswith(" 5G")
+            for kind, query in variants(name, brand):
+                totals = results.setdefault(kind, {"total": 0, "legacy": 0, "resolver": 0, "wrong": 0})
+                totals["total"] += 1
+                if legacy_find_model_id(model_reference, query, has_5g)[1] == name:
+                    totals["legacy"] += 1
+
+                match = resolver.resolve(query, brand, has_5g)
+                if match and match.name == name:
+                    totals["resolver"] += 1
+                elif match:
+                    totals["wrong"] += 1
+
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    resolver.resolve(query, brand, has_5g)
+                latencies.append((time.perf_counter() - started) / args.repeat * 1e6)
+
+    print(f"{'variante':>13} {'consultas':>10} {'anterior':>9} {'resolver':>9} {'erróneas':>9}")
+    for kind, totals in results.items():
+        print(f"{kind:>13} {totals['total']:>10} {totals['legacy']:>9} {totals['resolver']:>9} {totals['wrong']:>9}")
+
+    print(f"\nLatencia por consulta: p50 {percentile(latencies, 0.5):.1f} µs, "
+          f"p99 {percentile(latencies, 0.99):.1f} µs, máx {max(latencies):.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compara la carga de los datos de referencia con pandas, con csv y desde el bundle.
+
+Uso (desde server/):
+    python build_reference_bundle.py
+    python benchmarks/bench_reference_load.py [--repeat 50]
+
+Comprueba que las tres cargas devuelven los mismos datos y mide su tiempo,
+incluida la importación de pandas que hacía la carga anterior.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.constants import DATA_DIR  # noqa: E402
+from agent.reference_bundle import REFERENCE_BUNDLE_PATH, load_bundle, read_reference_csvs  # noqa: E402
+
+
+# Cargadores anteriores con pandas, copiados tal cual como referencia
+def legacy_load():
+    import pandas as pd
+
+    df = pd.read_csv(DATA_DIR / "Modelo_REF.csv", sep=';')
+    model_mapping = dict(zip(df['Modelo'], df['Modelo_NUM']))
+
+    df = pd.read_csv(DATA_DIR / "Marca_Modelo_REF.csv", sep=';')
+    brand_models = {}
+    for _, row in df.iterrows():
+        brand = row['Marca'].lower()
+        model = row['Modelo']
+        if brand not in brand_models:
+            brand_models[brand] = []
+        brand_models[brand].append(model)
+
+    df = pd.read_csv(DATA_DIR / "Fecha_Lanzamiento.csv", sep=';')
+    release_dates = [
+        (name, datetime.strptime(date_str.split()[0], '%Y-%m-%d').date())
+        for name, date_str in zip(df['Modelo'], df['Fecha de Lanzamiento'])
+    ]
+    return model_mapping, brand_models, release_dates
+
+
+def time_load(load, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def pandas_import_ms() -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import pandas; print(time.perf_counter() - t)"],
+        capture_output=True, text=True, check=True)
+    return float(result.stdout) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if not REFERENCE_BUNDLE_PATH.exists():
+        sys.exit(f"{REFERENCE_BUNDLE_PATH} not found, run build_reference_bundle.py first")
+
+    legacy = legacy_load()
+    for label, data in (("csv", read_reference_csvs()), ("bundle", load_bundle())):
+        assert (dict(legacy[0]), legacy[1], legacy[2]) == \
+            (data.model_reference, data.brand_models, data.release_dates), f"{label} differs from pandas"
+    print("Los tres cargadores devuelven los mismos datos\n")
+
+    print(f"{'carga':>22} {'ms':>8}")
+    print(f"{'import pandas':>22} {pandas_import_ms():>8.1f}")
+    print(f"{'pandas (sin import)':>22} {time_load(legacy_load, args.repeat):>8.2f}")
+    print(f"{'csv':>22} {time_load(read_reference_csvs, args.repeat):>8.2f}")
+    print(f"{'bundle':>22} {time_load(load_bundle, args.repeat):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
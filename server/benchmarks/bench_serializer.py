@@ -0,0 +1,138 @@
+"""Compara la serialización del estado del agente antes y después del codec con orjson.
+
+Uso (desde server/):
+    python benchmarks/bench_serializer.py [--repeat 20]
+
+Mide el viaje completo estado -> JSON -> estado para estados de 10, 100 y
+1000 mensajes.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage  # noqa: E402
+
+from agent.agent_state import initialize_state  # noqa: E402
+from agent.models import BuyingInfo, DeviceInfo  # noqa: E402
+from utils.message_codec import dumps, loads  # noqa: E402
+from utils.serializer import deserialize_state, serialize_message_frontend, serialize_state  # noqa: E402
+
+
+# Implementación anterior, copiada tal cual como referencia
+def legacy_serialize_message_full(message):
+    data = {"_message_type": type(message).__name__}
+    if hasattr(message, "content"):
+        data["content"] = message.content
+    if isinstance(message, AIMessage) and hasattr(message, "additional_kwargs"):
+        data["additional_kwargs"] = message.additional_kwargs
+    if isinstance(message, ToolMessage) and hasattr(message, "tool_call_id"):
+        data["tool_call_id"] = message.tool_call_id
+    if hasattr(message, "__dict__"):
+        for key, value in message.__dict__.items():
+            if key not in ["content", "additional_kwargs", "tool_call_id"] and not key.startswith("_"):
+                try:
+                    json.dumps(value)
+                    data[key] = value
+                except (TypeError, OverflowError):
+                    data[key] = str(value)
+    return data
+
+
+def legacy_serialize_model(model):
+    data = model.dict()
+    if isinstance(data.get("release_date"), date):
+        data["release_date"] = data["release_date"].isoformat()
+    return data
+
+
+def legacy_serialize_state(state):
+    serialized_state = state.copy()
+    serialized_state["messages"] = [legacy_serialize_message_full(msg) for msg in state["messages"]]
+    serialized_state["frontend_messages"] = [serialize_message_frontend(msg) for msg in state["messages"]]
+    serialized_state["device_info"] = legacy_serialize_model(state["device_info"])
+    serialized_state["buying_info"] = legacy_serialize_model(state["buying_info"])
+    return serialized_state
+
+
+def legacy_deserialize_message(data):
+    message_type = data["_message_type"]
+    if message_type == "AIMessage":
+        return AIMessage(content=data.get("content", ""), additional_kwargs=data.get("additional_kwargs", {}))
+    if message_type == "HumanMessage":
+        return HumanMessage(content=data.get("content", ""))
+    if message_type == "ToolMessage":
+        return ToolMessage(content=data.get("content", ""), tool_call_id=data.get("tool_call_id", "default_tool_call_id"))
+    return SystemMessage(content=data.get("content", ""))
+
+
+def legacy_deserialize_state(state):
+    deserialized_state = state.copy()
+    del deserialized_state["frontend_messages"]
+    deserialized_state["messages"] = [legacy_deserialize_message(msg) for msg in state["messages"]]
+    device_data = dict(deserialized_state["device_info"])
+    if device_data.get("release_date"):
+        device_data["release_date"] = date.fromisoformat(device_data["release_date"])
+    deserialized_state["device_info"] = DeviceInfo(**device_data)
+    deserialized_state["buying_info"] = BuyingInfo(**deserialized_state["buying_info"])
+    return deserialized_state
+
+
+def build_state(n_messages: int) -> dict:
+    state = initialize_state()
+    messages = [SystemMessage(content="Eres un asistente de compra-venta de smartphones.")]
+    for i in range(n_messages - 1):
+        kind = i % 4
+        if kind == 0:
+            messages.append(HumanMessage(content=f"Quiero vender mi iPhone 13 de 128GB, mensaje {i}"))
+        elif kind == 1:
+            messages.append(AIMessage(
+                content="",
+                tool_calls=[{"name": "predict_price", "args": {"brand": "Apple", "model": "iPhone 13"}, "id": f"call_{i}"}],
+                response_metadata={"token_usage": {"total_tokens": 120}, "model_name": "gpt-4"},
+            ))
+        elif kind == 2:
+            messages.append(ToolMessage(content='{"predicted_price": 412.5}', tool_call_id=f"call_{i - 1}"))
+        else:
+            messages.append(AIMessage(content="El precio estimado de tu dispositivo es de 412,50 €. " * 4))
+    state["messages"] = messages
+    return state
+
+
+def time_round_trip(serialize, deserialize, encode, decode, state, repeat: int) -> float:
+    """Mejor tiempo de repeat viajes completos, en ms (el mínimo es estable frente a GC y ruido)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        deserialize(decode(encode(serialize(state))))
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'mensajes':>9} {'anterior (ms)':>14} {'codec (ms)':>11} {'mejora':>7}")
+    for n_messages in (10, 100, 1000):
+        state = build_state(n_messages)
+
+        # Comprobar que el codec conserva los mensajes
+        restored = deserialize_state(loads(dumps(serialize_state(state))))
+        assert [(type(m), m.content) for m in restored["messages"]] == \
+            [(type(m), m.content) for m in state["messages"]]
+
+        legacy_ms = time_round_trip(legacy_serialize_state, legacy_deserialize_state,
+                                    json.dumps, json.loads, state, args.repeat)
+        codec_ms = time_round_trip(serialize_state, deserialize_state,
+                                   dumps, loads, state, args.repeat)
+        print(f"{n_messages:>9} {legacy_ms:>14.2f} {codec_ms:>11.2f} {legacy_ms / codec_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compara XGBRegressor.predict con el evaluador de árboles aplanados en NumPy.
+
+Uso (desde server/):
+    python benchmarks/bench_tree_inference.py [--rows 20000] [--repeat 20]
+
+Para cada modelo de agent/models comprueba que las predicciones de
+FlatTreeEnsemble son idénticas a las de XGBoost (también con valores
+ausentes) y mide la latencia con 1, 100 y 10000 filas. Termina con error si
+alguna predicción difiere.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.constants import GRADE_MAPPING, MODELS_DIR, STORAGE_OPTIONS, SUPPORTED_BRANDS  # noqa: E402
+from agent.tree_inference import FlatTreeEnsemble  # noqa: E402
+from agent.utils import load_xgboost_model  # noqa: E402
+
+
+def random_features(n_rows: int, seed: int = 0) -> np.ndarray:
+    """Filas [Modelo, Almacenamiento, días desde el lanzamiento, Grado] como las de predict_price."""
+    rng = np.random.default_rng(seed)
+    storages = [int(storage.replace("GB", "").replace("TB", "000")) for storage in STORAGE_OPTIONS]
+    return np.column_stack([
+        rng.integers(1, 107, n_rows),
+        rng.choice(storages, n_rows),
+        rng.integers(0, 3000, n_rows),
+        rng.choice(sorted(set(GRADE_MAPPING.values())), n_rows),
+    ]).astype(np.float32)
+
+
+def time_predict(predict, X, repeat: int) -> float:
+    predict(X)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predict(X)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    X = random_features(args.rows)
+    X_missing = X.copy()
+    X_missing[np.random.default_rng(1).random(X.shape) < 0.05] = np.nan
+
+    failures = 0
+    for brand, filename in SUPPORTED_BRANDS.items():
+        if not (MODELS_DIR / filename).exists():
+            continue
+        model = load_xgboost_model(brand)
+        ensemble = FlatTreeEnsemble.from_xgboost(model)
+        print(f"\n{brand}: {ensemble.num_trees} árboles, profundidad {ensemble.max_depth}, "
+              f"{ensemble.memory_bytes} bytes")
+
+        for label, features in (("completas", X), ("con ausentes", X_missing)):
+            expected = model.predict(features)
+            actual = ensemble.predict(features)
+            mismatches = int((expected != actual).sum())
+            failures += mismatches
+            print(f"  paridad ({label}): {mismatches} diferencias en {len(features)} filas, "
+                  f"máx {float(np.abs(expected - actual).max()):.6f}")
+
+        print(f"  {'filas':>6} {'xgboost (ms)':>13} {'numpy (ms)':>11} {'mejora':>7}")
+        for n_rows in (1, 100, 10000):
+            batch = X[:n_rows]
+            xgboost_ms = time_predict(model.predict, batch, args.repeat)
+            numpy_ms = time_predict(ensemble.predict, batch, args.repeat)
+            print(f"  {n_rows:>6} {xgboost_ms:>13.3f} {numpy_ms:>11.3f} {xgboost_ms / numpy_ms:>6.1f}x")
+
+    if failures:
+        sys.exit(f"\n{failures} predicciones difieren de XGBoost")
+
+
+if __name__ == "__main__":
+    main()
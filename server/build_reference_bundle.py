@@ -0,0 +1,38 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from agent.constants import DATA_DIR
+from agent.reference_bundle import BUNDLE_FORMAT_VERSION, REFERENCE_BUNDLE_PATH, build_bundle, load_bundle
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate the reference CSV files and compile them into the SQLite bundle loaded at runtime")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR,
+                        help="directory with Modelo_REF.csv, Marca_Modelo_REF.csv and Fecha_Lanzamiento.csv")
+    parser.add_argument("-o", "--output", type=Path, default=REFERENCE_BUNDLE_PATH,
+                        help="bundle file to write")
+    args = parser.parse_args()
+
+    print(f"🔄 Validating reference data in {args.data_dir}...")
+    try:
+        data = build_bundle(args.output, args.data_dir)
+    except (OSError, ValueError) as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+
+    # Comprobar que el bundle recién escrito se carga con las mismas comprobaciones que en producción
+    start = time.perf_counter()
+    bundle = load_bundle(args.output, args.data_dir)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    print(f"✅ {len(data.model_reference)} models, {len(data.brand_models)} brands, "
+          f"{len(data.release_dates)} release dates")
+    print(f"✅ Bundle v{BUNDLE_FORMAT_VERSION} written to {args.output} "
+          f"({args.output.stat().st_size} bytes, checksum {bundle.checksum()[:12]}, loads in {load_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
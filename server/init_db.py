@@ -1,4 +1,4 @@
-from models.database import Base, engine, SessionLocal
+from models.database import Base, add_missing_columns, engine, SessionLocal
 from dotenv import load_dotenv
 import sys
 import argparse
@@ -32,8 +32,9 @@ def init_database(force=False):
         try:
             # This will create any missing tables without dropping existing ones
             Base.metadata.create_all(bind=engine)
+            add_missing_columns()
             print(f"✅ Database structure verified - found {len(existing_tables)} existing tables")
-            print("✅ Added any missing tables")
+            print("✅ Added any missing tables and columns")
             return
         except Exception as e:
             print(f"\n⚠️ Error checking database structure: {str(e)}")
@@ -1,23 +1,94 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
+import os
 from fastapi import FastAPI, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from uuid import uuid4
-from typing import Optional
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage
+from typing import Any, Optional
+import json
+from langchain_core.messages import SystemMessage
 
-from models.database import UserSession, Chat, get_db, Base, engine
+from models.chat_store import CONVERSATION_TYPES, append_messages, backfill_chat_summaries, unlock_token_limited_chats, delete_chat_messages, get_chat_messages, has_human_message, list_session_chats, message_to_dict, migrate_legacy_messages
+from models.database import UserSession, Chat, add_missing_columns, run_db, get_db, session_scope, Base, engine
 from models.schemas import Message, ChatRequest, ChatResponse, ChatCreateRequest, ChatUpdateRequest, MessageRequest
-from agent.main import react_graph
-from agent.agent_state import initialize_state
-from langchain.schema import HumanMessage, AIMessage
-from utils.serializer import serialize_state, deserialize_state, get_frontend_messages, serialize_message_frontend
+from agent.prediction_cache import PREDICTION_CACHE
+from langchain_core.messages import HumanMessage, AIMessage
+from utils.serializer import serialize_chat_state, deserialize_chat_state, serialize_message_frontend
+from utils.agent_runner import AgentRunner
+from utils.session_store import SessionStateStore
+from utils.title_worker import TitleWorker, heuristic_title
+from utils.warm_up import WarmUp
 
 # Crear tablas
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
+with session_scope() as db:
+    backfill_chat_summaries(db)
+    unlock_token_limited_chats(db)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El warm-up corre en su propio hilo: el servidor acepta peticiones enseguida
+    WARM_UP.start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Pool acotado donde se ejecuta el agente para no bloquear el event loop
+agent_runner = AgentRunner(int(os.getenv("AGENT_MAX_CONCURRENCY", "4")))
+
+# LLM de los títulos según MODEL_ROUTES; comparte la caché de respuestas y se crea en el primer uso
+title_llm = None
+
+
+def get_title_llm():
+    global title_llm
+    if title_llm is None:
+        from agent.model_routing import get_llm
+        title_llm = get_llm("title")
+    return title_llm
+
+
+def initialize_state() -> dict:
+    """Estado inicial del agente; agent_state depende de LangGraph y se importa al usarlo."""
+    from agent import agent_state
+    return agent_state.initialize_state()
+
+
+def get_react_graph():
+    """Grafo del agente. El módulo (LangGraph, XGBoost, pandas y los CSV de
+    referencia) se importa en el warm-up o, si aún no ha terminado, en el
+    primer uso."""
+    from agent.main import react_graph
+    return react_graph
+
+def save_generated_title(chat_id: str, title: str, placeholder: str) -> None:
+    """Guarda el título generado salvo que el chat se haya renombrado entretanto."""
+    with session_scope() as db:
+        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        if chat and chat.title == placeholder:
+            chat.title = title
+            db.commit()
+
+
+# Generación de títulos fuera del camino de la respuesta
+title_worker = TitleWorker(
+    lambda message: generate_title_for_chat(message),
+    save_generated_title,
+    max_attempts=int(os.getenv("TITLE_MAX_ATTEMPTS", "3"))
+)
+
+# Chats por página en el listado de la sesión
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "50"))
+CHAT_PAGE_MAX_SIZE = 200
+
+# Estado del agente por sesión (el del último chat con actividad), cacheado en memoria
+SESSION_STORE = SessionStateStore(int(os.getenv("SESSION_CACHE_SIZE", "256")))
 
 # Configurar CORS
 app.add_middleware(
@@ -30,62 +101,104 @@ app.add_middleware(
 )
 
 
+def load_agent() -> None:
+    get_react_graph()
+
+
+def warm_up_models() -> None:
+    """Carga los modelos de predicción de todas las marcas."""
+    from agent.model_registry import MODEL_REGISTRY
+    stats = MODEL_REGISTRY.warm_up()
+    loaded = sum(1 for entry in stats.values() if entry["loaded"])
+    print(f"Warmed up {loaded}/{len(stats)} brand models")
+
+
+def load_tokenizer() -> None:
+    """Carga (o descarga) la codificación de tiktoken usada para medir el contexto."""
+    from agent.context_window import count_text_tokens
+    count_text_tokens("")
+
+
+def refresh_price_table() -> None:
+    """Precalcula la tabla de precios usada por recommend_device."""
+    from agent.tools import PRICE_TABLE
+    PRICE_TABLE.refresh()
+
+
+# Módulos y datos pesados cargados en segundo plano para que el servidor responda en cuanto arranca
+WARM_UP = WarmUp([
+    ("agent", load_agent),
+    ("models", warm_up_models),
+    ("price_table", refresh_price_table),
+    ("tokenizer", load_tokenizer),
+    ("title_llm", get_title_llm),
+])
+
+
 def get_or_create_session(db: Session, session_id: Optional[str] = None) -> tuple[str, dict]:
     if session_id:
-        session = db.query(UserSession).filter(
-            UserSession.user_id == session_id).first()
-        if session:
-            return session_id, deserialize_state(session.session_data)
+        session_data = SESSION_STORE.get(db, session_id)
+        # Las sesiones sin estado guardado se inicializan con el mensaje de bienvenida
+        if session_data and session_data.get("messages"):
+            return session_id, session_data
 
     new_session_id = session_id or str(uuid4())
     session_data = initialize_state()
-    new_session = UserSession(
-        user_id=new_session_id,
-        session_data=serialize_state(session_data)
-    )
-    db.add(new_session)
-    db.commit()
+    SESSION_STORE.save(db, new_session_id, session_data)
     return new_session_id, session_data
 
 
-def get_chat_preview(messages):
-    """Extract a preview from chat messages"""
-    if not messages or len(messages) == 0:
-        return ""
-
-    # Try to find the last meaningful message
-    for msg in reversed(messages):
-        if isinstance(msg, dict) and "content" in msg and msg.get("type") in ["Human", "AI"]:
-            return msg["content"][:100]
-
-    return ""
-
 # Añadir este endpoint al final del archivo
 @app.get("/health-check")
 async def health_check():
     """Verificar si el servidor está activo y listo para recibir peticiones."""
-    return {"status": "up", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "up",
+        "ready": WARM_UP.ready,
+        "state": WARM_UP.state,
+        "errors": dict(WARM_UP.errors),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Métricas internas del servidor."""
+    from agent.llm_cache import LLM_CACHE
+    from agent.model_routing import NODE_METRICS
+    from agent.tools import MODEL_RESOLVER
+    from agent.utils import INTENT_STATS
+    return {
+        "warm_up": WARM_UP.stats(),
+        "agent": agent_runner.stats(),
+        "intent": dict(INTENT_STATS),
+        "sessions": SESSION_STORE.stats(),
+        "llm_cache": LLM_CACHE.stats() if LLM_CACHE else None,
+        "titles": title_worker.stats(),
+        "llm_nodes": NODE_METRICS.stats(),
+        "predictions": PREDICTION_CACHE.stats(),
+        "model_resolver": MODEL_RESOLVER.stats(),
+    }
 
 @app.post("/init-session")
-async def init_session(db: Session = Depends(get_db)):
-    # Create session with default chat
-    session_id = str(uuid4())
-    session = UserSession(user_id=session_id)
-    db.add(session)
-    db.commit()  # Commit the session first to ensure it exists before creating chat
+async def init_session():
+    return await run_db(create_session_with_chat)
+
+
+def create_session_with_chat(db: Session) -> dict:
+    # Create session with default chat; the session is committed before creating the chat
+    session_id, initial_state = get_or_create_session(db)
 
     # Create welcome chat with proper initial state
     chat_id = str(uuid4())
-    initial_state = initialize_state()
     initial_message = serialize_message_frontend(initial_state["messages"][0])
 
     chat = Chat(
         id=chat_id,
         user_id=session_id,
-        title="Nueva conversación",
-        messages=[initial_message]
+        title="Nueva conversación"
     )
     db.add(chat)
+    append_messages(db, chat, [initial_message], start_seq=0)
     db.commit()
 
     return {
@@ -100,16 +213,31 @@ async def init_session(db: Session = Depends(get_db)):
 
 
 @app.get("/sessions/{session_id}/chats")
-async def get_session_chats(session_id: str, db: Session = Depends(get_db)):
+async def get_session_chats(session_id: str, limit: int = CHAT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Lista los chats de la sesión, del más reciente al más antiguo, por páginas.
+
+    La página siguiente se pide pasando nextCursor como cursor.
+    """
+    limit = max(1, min(limit, CHAT_PAGE_MAX_SIZE))
+    result = await run_db(load_session_chats, session_id, limit, cursor)
+    if result is None:
+        # Create new session if not found
+        return await init_session()
+    return result
+
+
+def load_session_chats(db: Session, session_id: str, limit: int, cursor: Optional[str]) -> Optional[dict]:
     # Check if session exists
     session = db.query(UserSession).filter(
         UserSession.user_id == session_id).first()
     if not session:
-        # Create new session if not found
-        return await init_session(db)
+        return None
 
     # Get existing chats
-    chats = db.query(Chat).filter(Chat.user_id == session_id).all()
+    try:
+        chats, next_cursor = list_session_chats(db, session_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
     return {
         "sessionId": session_id,
@@ -117,14 +245,17 @@ async def get_session_chats(session_id: str, db: Session = Depends(get_db)):
             "id": chat.id,
             "title": chat.title,
             "createdAt": chat.created_at.isoformat(),
-            "previewText": get_chat_preview(chat.messages),
+            "updatedAt": chat.updated_at.isoformat() if chat.updated_at else None,
+            "previewText": chat.preview_text or "",
+            "messageCount": chat.message_count,
             "tokenLimitReached": chat.token_limit_reached  
-        } for chat in chats]
+        } for chat in chats],
+        "nextCursor": next_cursor
     }
 
 
 @app.post("/chats")
-async def create_chat(request: ChatCreateRequest, db: Session = Depends(get_db)):
+def create_chat(request: ChatCreateRequest, db: Session = Depends(get_db)):
     # Verify session exists
     session = db.query(UserSession).filter(
         UserSession.user_id == request.sessionId).first()
@@ -139,11 +270,11 @@ async def create_chat(request: ChatCreateRequest, db: Session = Depends(get_db))
     chat = Chat(
         id=chat_id,
         user_id=request.sessionId,
-        title=request.title,
-        messages=[initial_message]
+        title=request.title
     )
 
     db.add(chat)
+    append_messages(db, chat, [initial_message], start_seq=0)
     db.commit()
     db.refresh(chat)
 
@@ -156,15 +287,25 @@ async def create_chat(request: ChatCreateRequest, db: Session = Depends(get_db))
 
 
 @app.get("/chats/{chat_id}")
-async def get_chat(chat_id: str, db: Session = Depends(get_db)):
+async def get_chat(chat_id: str, limit: Optional[int] = None, before: Optional[int] = None):
+    """Devuelve el chat con sus mensajes; con limit/before se pagina desde el final."""
+    return await run_db(load_chat, chat_id, limit, before)
+
+
+def load_chat(db: Session, chat_id: str, limit: Optional[int], before: Optional[int]) -> dict:
     # Find the chat
     chat = db.query(Chat).filter(Chat.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
+    if chat.messages:
+        migrate_legacy_messages(db, chat)
+        db.commit()
+
+    rows = get_chat_messages(db, chat_id, limit=limit, before_seq=before)
+
     # Log the messages being returned
-    print(
-        f"Retrieving chat {chat_id} with {len(chat.messages) if chat.messages else 0} messages")
+    print(f"Retrieving chat {chat_id} with {len(rows)} messages")
 
     # Return chat with messages
     return {
@@ -172,13 +313,15 @@ async def get_chat(chat_id: str, db: Session = Depends(get_db)):
         "title": chat.title,
         "createdAt": chat.created_at.isoformat(),
         "userId": chat.user_id,
-        "messages": chat.messages,
+        "messages": [message_to_dict(row) for row in rows],
+        # seq del mensaje más antiguo devuelto, para pedir la página anterior con before
+        "oldestSeq": rows[0].seq if rows else None,
         "tokenLimitReached": chat.token_limit_reached  # Añadir esta propiedad
     }
     
 # Añadir en main.py
 @app.get("/chats/{chat_id}/state")
-async def get_chat_state(chat_id: str, db: Session = Depends(get_db)):
+def get_chat_state(chat_id: str, db: Session = Depends(get_db)):
     # Encontrar el chat
     chat = db.query(Chat).filter(Chat.id == chat_id).first()
     if not chat:
@@ -187,11 +330,14 @@ async def get_chat_state(chat_id: str, db: Session = Depends(get_db)):
     # Devolver solo la información de estado que necesitamos
     return {
         "id": chat.id,
+        "title": chat.title,
+        # True mientras el título definitivo se está generando en segundo plano
+        "titlePending": title_worker.is_pending(chat.id),
         "tokenLimitReached": chat.token_limit_reached
     }
 
 @app.put("/chats/{chat_id}")
-async def update_chat(chat_id: str, request: ChatUpdateRequest, db: Session = Depends(get_db)):
+def update_chat(chat_id: str, request: ChatUpdateRequest, db: Session = Depends(get_db)):
     # Find the chat
     chat = db.query(Chat).filter(Chat.id == chat_id).first()
     if not chat:
@@ -210,13 +356,14 @@ async def update_chat(chat_id: str, request: ChatUpdateRequest, db: Session = De
 
 
 @app.delete("/chats/{chat_id}")
-async def delete_chat(chat_id: str, db: Session = Depends(get_db)):
+def delete_chat(chat_id: str, db: Session = Depends(get_db)):
     # Find the chat
     chat = db.query(Chat).filter(Chat.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
     # Delete the chat
+    delete_chat_messages(db, chat_id)
     db.delete(chat)
     db.commit()
 
@@ -224,207 +371,266 @@ async def delete_chat(chat_id: str, db: Session = Depends(get_db)):
 
 
 @app.post("/chats/{chat_id}/message")
-async def chat_message(chat_id: str, request: MessageRequest, db: Session = Depends(get_db)):
+async def chat_message(chat_id: str, request: MessageRequest):
+    # El agente y la base de datos son bloqueantes: procesar en el pool del agente
+    return await agent_runner.run(process_chat_message, chat_id, request)
+
+
+def process_chat_message(chat_id: str, request: MessageRequest) -> dict:
+    """Procesa un mensaje de forma síncrona: agente, título y persistencia."""
+    with session_scope() as db:
+        return handle_chat_message(chat_id, request, db)
+
+
+def handle_chat_message(chat_id: str, request: MessageRequest, db: Session) -> dict:
+    session_state, last_message_index, needs_title = prepare_chat_turn(
+        db, chat_id, request.content)
+
+    try:
+        # Process with agent
+        result = get_react_graph().invoke(session_state, {"recursion_limit": 100})
+        return complete_chat_turn(db, chat_id, request.content, result,
+                                  last_message_index, needs_title)
+    except Exception as e:
+        return handle_chat_error(db, chat_id, request.content, e)
+
+
+@app.post("/chats/{chat_id}/message/stream")
+async def chat_message_stream(chat_id: str, request: MessageRequest):
+    """Versión en streaming (SSE) de /chats/{chat_id}/message.
+
+    Emite los tokens del asistente y el progreso de las herramientas según se
+    producen, y un evento final ``done`` con la misma respuesta que el endpoint
+    normal una vez guardados los mensajes.
+    """
+    # Validar el chat antes de empezar a emitir eventos para poder devolver 404/400
+    session_state, last_message_index, needs_title = await run_in_threadpool(
+        run_in_session, prepare_chat_turn, chat_id, request.content)
+
+    return StreamingResponse(
+        stream_chat_turn(chat_id, request.content, session_state,
+                         last_message_index, needs_title),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def run_in_session(func, *args):
+    """Ejecuta func(db, *args) con una sesión propia."""
+    with session_scope() as db:
+        return func(db, *args)
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def stream_chat_turn(chat_id: str, content: str, session_state: dict,
+                           last_message_index: int, needs_title: bool):
+    async with agent_runner.slot():
+        result = None
+        try:
+            # Si el warm-up no ha terminado, importar el agente fuera del event loop
+            react_graph = await run_in_threadpool(get_react_graph)
+            async for event in react_graph.astream_events(
+                    session_state, {"recursion_limit": 100}, version="v2"):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+
+                if kind == "on_chat_model_stream" and node == "assistant":
+                    token = event["data"]["chunk"].content
+                    if token:
+                        yield sse_event("token", {"content": token})
+                elif kind == "on_tool_start":
+                    yield sse_event("tool_start", {
+                        "name": event["name"],
+                        "input": event["data"].get("input")
+                    })
+                elif kind == "on_tool_end":
+                    yield sse_event("tool_end", {"name": event["name"]})
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # Estado final del grafo
+                    result = event["data"]["output"]
+
+            response = await run_in_threadpool(
+                run_in_session, complete_chat_turn, chat_id, content, result,
+                last_message_index, needs_title)
+        except Exception as e:
+            try:
+                response = await run_in_threadpool(
+                    run_in_session, handle_chat_error, chat_id, content, e)
+            except HTTPException as http_error:
+                yield sse_event("error", {"detail": http_error.detail})
+                return
+
+        yield sse_event("done", response)
+
+
+def prepare_chat_turn(db: Session, chat_id: str, content: str) -> tuple[dict, int, bool]:
+    """Construye el estado del agente para un nuevo mensaje del usuario."""
     # Find the chat
     chat = db.query(Chat).filter(Chat.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    # Check if the chat is already marked as token limited
-    if chat.token_limit_reached:
-        raise HTTPException(
-            status_code=400, detail="Token limit reached for this conversation")
+    if chat.messages:
+        migrate_legacy_messages(db, chat)
+        db.commit()
 
     # Check if this is the first human message and chat has default title
-    is_first_message = not chat.messages or not any(
-        msg.get("type") == "Human" for msg in chat.messages)
+    is_first_message = not has_human_message(db, chat_id)
     has_default_title = chat.title == "Nueva conversación"
 
+    history = get_chat_messages(db, chat_id, types=CONVERSATION_TYPES)
+
     # Log the initial state
-    print(
-        f"Chat {chat_id} before adding message: {len(chat.messages) if chat.messages else 0} messages")
+    print(f"Chat {chat_id} before adding message: {len(history)} messages")
 
-    try:
-        # Initialize agent state from existing messages
-        session_state = initialize_state()
-
-        # Add existing messages to session state
-        if chat.messages:
-            session_state["messages"] = []
-            for msg in chat.messages:
-                if msg["type"] == "AI":
-                    session_state["messages"].append(
-                        AIMessage(content=msg["content"]))
-                elif msg["type"] == "Human":
-                    session_state["messages"].append(
-                        HumanMessage(content=msg["content"]))
-
-        # Record the current message count to identify new messages later
-        last_message_index = len(session_state["messages"])
-
-        # Add the new message
-        human_message = HumanMessage(content=request.content)
-        session_state["messages"].append(human_message)
-
-        # Create a new messages list instead of modifying in place
-        new_messages_list = list(chat.messages) if chat.messages else []
-
-        # Add human message
-        new_messages_list.append({
-            "type": "Human",
-            "content": request.content
-        })
+    # Initialize agent state from existing messages
+    session_state = initialize_state()
 
-        # Process with agent
-        result = react_graph.invoke(session_state, {"recursion_limit": 100})
+    # Add existing messages to session state
+    if history:
+        session_state["messages"] = [
+            AIMessage(content=msg.content) if msg.type == "AI" else HumanMessage(content=msg.content)
+            for msg in history
+        ]
 
-        # Get new messages from the result
-        agent_new_messages = result["messages"][last_message_index + 1:]
-        response_messages = [serialize_message_frontend(
-            msg) for msg in agent_new_messages]
+    # Restaurar intención, etapa e información extraída del turno anterior
+    if chat.chat_state:
+        session_state.update(deserialize_chat_state(chat.chat_state))
 
-        # Add AI responses to the new messages list
-        for msg in response_messages:
-            new_messages_list.append(msg)
+    # Record the current message count to identify new messages later
+    last_message_index = len(session_state["messages"])
 
-        # Generate title if this is the first human message and chat has default title
-        updated_title = None
-        if is_first_message and has_default_title:
-            try:
-                # Reuse the LLM from react_graph if possible
-                llm = getattr(react_graph, "llm", None) or ChatOpenAI(
-                    model="gpt-4", temperature=0.7)
-                updated_title = generate_title_for_chat(request.content, llm)
-                chat.title = updated_title
-                print(
-                    f"Generated new title for chat {chat_id}: '{updated_title}'")
-            except Exception as e:
-                print(f"Error generating title: {str(e)}")
-
-        # Explicitly set the messages column to the new list
-        # This ensures SQLAlchemy knows the column has changed
-        chat.messages = new_messages_list
-
-        # Update chat in the database
-        db.commit()
-        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    # Add the new message
+    session_state["messages"].append(HumanMessage(content=content))
 
-        # Convert to Message format for response
-        formatted_response = [
-            Message(content=msg["content"], type=msg["type"])
-            for msg in response_messages
-        ]
+    return session_state, last_message_index, is_first_message and has_default_title
 
-        # Include the new title in the response if it was updated
-        response = {
-            "messages": formatted_response,
-            "chatId": chat_id
-        }
 
-        if updated_title:
-            response["title"] = updated_title
+def complete_chat_turn(db: Session, chat_id: str, content: str, result: dict,
+                       last_message_index: int, needs_title: bool) -> dict:
+    """Guarda el mensaje del usuario y las respuestas del agente y construye la respuesta."""
+    chat = db.query(Chat).filter(Chat.id == chat_id).first()
 
-        return response
+    # Get new messages from the result
+    agent_new_messages = result["messages"][last_message_index + 1:]
+    response_messages = [serialize_message_frontend(
+        msg) for msg in agent_new_messages]
 
-    except Exception as e:
-        error_message = str(e)
-        print(f"Error in chat processing: {error_message}")
-
-        # Detección mejorada para los errores de límite de tokens de OpenAI
-        is_token_limit_error = any([
-            "maximum context length" in error_message,
-            "token limit" in error_message,
-            "too many tokens" in error_message,
-            "context_length_exceeded" in error_message,
-            "This model's maximum context length" in error_message,
-            "resulted in" in error_message and "tokens" in error_message
-        ])
-
-        if is_token_limit_error:
-            # Marcar el chat como limitado por tokens
-            chat.token_limit_reached = True
-
-            # Agregar mensaje de error como mensaje AI
-            token_limit_message = {
-                "type": "AI",
-                "content": "⚠️ Esta conversación ha alcanzado el límite de tokens. No se pueden procesar más mensajes en este chat. Por favor, crea una nueva conversación para continuar."
-            }
-
-            # Añadir el mensaje a la lista de mensajes
-            new_messages_list = list(chat.messages) if chat.messages else []
-
-            # Asegurar que el mensaje del usuario también se guarda
-            if not any(msg.get("content") == request.content and msg.get("type") == "Human"
-                    for msg in new_messages_list):
-                new_messages_list.append({
-                    "type": "Human",
-                    "content": request.content
-                })
-
-            new_messages_list.append(token_limit_message)
-            chat.messages = new_messages_list
+    # Guardar el mensaje del usuario y las respuestas: una fila por mensaje
+    append_messages(db, chat, [{
+        "type": "Human",
+        "content": content
+    }] + response_messages)
 
-            db.commit()
+    # En el primer mensaje se pone un título heurístico; el del LLM se genera en segundo plano
+    updated_title = None
+    if needs_title:
+        updated_title = heuristic_title(content)
+        chat.title = updated_title
 
-            # Devolver respuesta con flag de límite alcanzado
-            return {
-                "messages": [Message(content=token_limit_message["content"], type=token_limit_message["type"])],
-                "chatId": chat_id,
-                "tokenLimitReached": True
-            }
+    chat.chat_state = serialize_chat_state(result)
 
-        # Si es otro tipo de error, intentar extraer información más detallada
-        try:
-            if hasattr(e, 'response') and e.response:
-                error_details = e.response.json()
-                error_message = error_details.get(
-                    'error', {}).get('message', str(e))
-
-            if 'BadRequestError' in str(type(e)) and 'context_length_exceeded' in error_message:
-                # Es una OpenAI BadRequestError por límite de contexto
-                chat.token_limit_reached = True
-
-                token_limit_message = {
-                    "type": "AI",
-                    "content": "⚠️ Esta conversación ha alcanzado el límite de tokens. No se pueden procesar más mensajes en este chat. Por favor, crea una nueva conversación para continuar."
-                }
-
-                new_messages_list = list(chat.messages) if chat.messages else []
-                if not any(msg.get("content") == request.content and msg.get("type") == "Human"
-                        for msg in new_messages_list):
-                    new_messages_list.append({
-                        "type": "Human",
-                        "content": request.content
-                    })
+    # Update chat in the database
+    db.commit()
+
+    # El estado de la sesión refleja el último chat con actividad (/messages)
+    SESSION_STORE.save(db, chat.user_id, result)
+
+    if needs_title:
+        title_worker.submit(chat_id, content, updated_title)
+
+    # Convert to Message format for response
+    formatted_response = [
+        Message(content=msg["content"], type=msg["type"])
+        for msg in response_messages
+    ]
+
+    # Include the new title in the response if it was updated
+    response = {
+        "messages": formatted_response,
+        "chatId": chat_id
+    }
 
-                new_messages_list.append(token_limit_message)
-                chat.messages = new_messages_list
+    if updated_title:
+        response["title"] = updated_title
+        response["titlePending"] = True
 
-                db.commit()
+    return response
 
-                return {
-                    "messages": [Message(content=token_limit_message["content"], type=token_limit_message["type"])],
-                    "chatId": chat_id,
-                    "tokenLimitReached": True
-                }
-        except:
-            pass  # Si falla este intento de extraer más detalles, continuar con la respuesta de error estándar
 
-        # Si es otro tipo de error, reenviar
-        raise HTTPException(
-            status_code=500, detail=f"Error processing message: {error_message}")
+# Aviso cuando un único mensaje no cabe en el contexto del modelo. El historial
+# antiguo se resume (agent/context_window.py), así que el chat no se bloquea
+CONTEXT_OVERFLOW_MESSAGE = "⚠️ Tu mensaje es demasiado largo para procesarlo. Por favor, divídelo en mensajes más cortos e inténtalo de nuevo."
+
+
+def context_overflow_response(db: Session, chat: Chat, chat_id: str, content: str) -> dict:
+    """Guarda el mensaje del usuario junto con el aviso y lo devuelve como respuesta."""
+    overflow_message = {
+        "type": "AI",
+        "content": CONTEXT_OVERFLOW_MESSAGE
+    }
+    append_messages(db, chat, [{
+        "type": "Human",
+        "content": content
+    }, overflow_message])
+    db.commit()
+
+    return {
+        "messages": [Message(content=overflow_message["content"], type=overflow_message["type"])],
+        "chatId": chat_id,
+        "tokenLimitReached": False
+    }
+
+
+def handle_chat_error(db: Session, chat_id: str, content: str, e: Exception) -> dict:
+    """Gestiona un error del agente: avisa si el mensaje no cabe en el contexto o lo convierte en HTTPException."""
+    db.rollback()
+    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+
+    error_message = str(e)
+    print(f"Error in chat processing: {error_message}")
+
+    # Detección mejorada para los errores de límite de tokens de OpenAI
+    is_token_limit_error = any([
+        "maximum context length" in error_message,
+        "token limit" in error_message,
+        "too many tokens" in error_message,
+        "context_length_exceeded" in error_message,
+        "This model's maximum context length" in error_message,
+        "resulted in" in error_message and "tokens" in error_message
+    ])
+
+    if is_token_limit_error:
+        return context_overflow_response(db, chat, chat_id, content)
+
+    # Si es otro tipo de error, intentar extraer información más detallada
+    try:
+        if hasattr(e, 'response') and e.response:
+            error_details = e.response.json()
+            error_message = error_details.get(
+                'error', {}).get('message', str(e))
+
+        if 'BadRequestError' in str(type(e)) and 'context_length_exceeded' in error_message:
+            # Es una OpenAI BadRequestError por límite de contexto
+            return context_overflow_response(db, chat, chat_id, content)
+    except:
+        pass  # Si falla este intento de extraer más detalles, continuar con la respuesta de error estándar
+
+    # Si es otro tipo de error, reenviar
+    raise HTTPException(
+        status_code=500, detail=f"Error processing message: {error_message}")
 
 
 @app.get("/messages/{session_id}", response_model=ChatResponse)
-async def get_messages(session_id: str, db: Session = Depends(get_db)):
-    session = db.query(UserSession).filter(
-        UserSession.user_id == session_id).first()
-    if not session:
+def get_messages(session_id: str, db: Session = Depends(get_db)):
+    # Obtenemos mensajes en formato frontend directamente del estado serializado
+    frontend_messages = SESSION_STORE.get_frontend_messages(db, session_id)
+    if frontend_messages is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Obtenemos mensajes en formato frontend
-    frontend_messages = get_frontend_messages(session.session_data)
-
     # Convertimos al formato Message para la respuesta
     response_messages = [
         Message(content=msg["content"], type=msg["type"])
@@ -440,8 +646,7 @@ async def get_messages(session_id: str, db: Session = Depends(get_db)):
 def generate_title_for_chat(user_message: str, llm=None) -> str:
     """Generate a concise, descriptive title based on user's first message"""
     if not llm:
-        # Use the same model as the agent but with different parameters
-        llm = ChatOpenAI(model="gpt-4", temperature=0.7)
+        llm = get_title_llm()
 
     system_prompt = """Genera un título corto y descriptivo (máximo 6 palabras) para una conversación 
     basado en el primer mensaje del usuario. El título debe capturar la esencia de lo que el usuario 
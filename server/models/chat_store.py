@@ -0,0 +1,199 @@
+import base64
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import Session
+
+from .database import Chat, ChatMessage
+
+# Tipos de mensaje que forman parte de la conversación visible
+CONVERSATION_TYPES = ("AI", "Human")
+
+PREVIEW_LENGTH = 100
+
+
+def message_to_dict(message: ChatMessage) -> Dict:
+    """Convierte una fila de chat_messages al formato de mensaje del frontend."""
+    data = {
+        "type": message.type,
+        "content": message.content
+    }
+    if message.tool_call_id:
+        data["tool_call_id"] = message.tool_call_id
+    return data
+
+
+def next_seq(db: Session, chat_id: str) -> int:
+    last_seq = db.query(func.max(ChatMessage.seq)).filter(
+        ChatMessage.chat_id == chat_id).scalar()
+    return 0 if last_seq is None else last_seq + 1
+
+
+def reserve_seqs(db: Session, chat_id: str, count: int) -> int:
+    """Reserva count posiciones seguidas al final del chat y devuelve la primera.
+
+    El contador es Chat.message_count y se incrementa con un UPDATE, que
+    bloquea la fila del chat (en SQLite, la escritura) hasta el commit. Así
+    dos turnos simultáneos del mismo chat no pueden obtener el mismo seq.
+    """
+    db.execute(
+        update(Chat).where(Chat.id == chat_id)
+        .values(message_count=Chat.message_count + count)
+        .execution_options(synchronize_session=False))
+    reserved = db.query(Chat.message_count).filter(Chat.id == chat_id).scalar()
+    return reserved - count
+
+
+def migrate_legacy_messages(db: Session, chat: Chat) -> None:
+    """Pasa los mensajes guardados en Chat.messages (formato antiguo) a chat_messages."""
+    if not chat.messages:
+        return
+
+    if db.query(ChatMessage.id).filter(ChatMessage.chat_id == chat.id).first() is None:
+        append_messages(db, chat, chat.messages, start_seq=0)
+        print(f"Migrated {len(chat.messages)} legacy messages of chat {chat.id}")
+    chat.messages = None
+
+
+def preview_from_messages(messages: List[Dict]) -> Optional[str]:
+    """Contenido (recortado) del último mensaje AI o Human de la lista."""
+    for message in reversed(messages):
+        if isinstance(message, dict) and message.get("type") in CONVERSATION_TYPES:
+            return (message.get("content") or "")[:PREVIEW_LENGTH]
+    return None
+
+
+def append_messages(db: Session, chat: Chat, messages: List[Dict], start_seq: Optional[int] = None) -> int:
+    """Añade mensajes al final del chat, una fila por mensaje, y actualiza su resumen.
+
+    Devuelve el siguiente seq.
+    """
+    seq = reserve_seqs(db, chat.id, len(messages)) if start_seq is None else start_seq
+    for message in messages:
+        db.add(ChatMessage(
+            chat_id=chat.id,
+            seq=seq,
+            type=message["type"],
+            content=message.get("content") or "",
+            tool_call_id=message.get("tool_call_id")
+        ))
+        seq += 1
+
+    preview = preview_from_messages(messages)
+    if preview is not None:
+        chat.preview_text = preview
+    chat.message_count = seq
+    chat.updated_at = datetime.utcnow()
+    return seq
+
+
+def get_chat_messages(
+    db: Session,
+    chat_id: str,
+    limit: Optional[int] = None,
+    before_seq: Optional[int] = None,
+    types: Optional[tuple] = None
+) -> List[ChatMessage]:
+    """Devuelve los mensajes del chat en orden; con limit, solo los últimos N (anteriores a before_seq)."""
+    query = db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id)
+    if before_seq is not None:
+        query = query.filter(ChatMessage.seq < before_seq)
+    if types:
+        query = query.filter(ChatMessage.type.in_(types))
+
+    if limit is None:
+        return query.order_by(ChatMessage.seq).all()
+
+    # Leer los últimos N desde el final del índice y devolverlos en orden
+    rows = query.order_by(ChatMessage.seq.desc()).limit(limit).all()
+    return list(reversed(rows))
+
+
+def has_human_message(db: Session, chat_id: str) -> bool:
+    return db.query(ChatMessage.id).filter(
+        ChatMessage.chat_id == chat_id, ChatMessage.type == "Human").first() is not None
+
+
+def get_chat_preview_text(db: Session, chat_id: str) -> str:
+    """Contenido (recortado) del último mensaje AI o Human del chat."""
+    last = get_chat_messages(db, chat_id, limit=1, types=CONVERSATION_TYPES)
+    return last[0].content[:PREVIEW_LENGTH] if last else ""
+
+
+def delete_chat_messages(db: Session, chat_id: str) -> None:
+    db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id).delete(
+        synchronize_session=False)
+
+
+def backfill_chat_summaries(db: Session) -> int:
+    """Rellena preview_text, message_count y updated_at de los chats creados antes de estas columnas."""
+    chats = db.query(Chat).filter(Chat.updated_at.is_(None)).all()
+    for chat in chats:
+        if chat.messages:
+            chat.preview_text = preview_from_messages(chat.messages) or ""
+            chat.message_count = len(chat.messages)
+        else:
+            chat.preview_text = get_chat_preview_text(db, chat.id)
+            chat.message_count = next_seq(db, chat.id)
+        chat.updated_at = chat.created_at or datetime.utcnow()
+    if chats:
+        db.commit()
+        print(f"Backfilled summary columns of {len(chats)} chats")
+    return len(chats)
+
+
+def encode_cursor(updated_at: datetime, chat_id: str) -> str:
+    raw = f"{updated_at.isoformat()}|{chat_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    updated_at, chat_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(updated_at), chat_id
+
+
+def list_session_chats(db: Session, user_id: str, limit: int, cursor: Optional[str] = None):
+    """Una página de chats del usuario, del más reciente al más antiguo.
+
+    Solo se leen las columnas del listado y la paginación es por clave
+    (updated_at, id), así que el coste de cada página no depende del número
+    de chats. Devuelve las filas y el cursor de la página siguiente (o None).
+    """
+    query = db.query(
+        Chat.id,
+        Chat.title,
+        Chat.created_at,
+        Chat.updated_at,
+        Chat.preview_text,
+        Chat.message_count,
+        Chat.token_limit_reached
+    ).filter(Chat.user_id == user_id)
+
+    if cursor:
+        updated_at, chat_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Chat.updated_at < updated_at,
+            and_(Chat.updated_at == updated_at, Chat.id < chat_id)
+        ))
+
+    rows = query.order_by(Chat.updated_at.desc(), Chat.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def unlock_token_limited_chats(db: Session) -> int:
+    """Desbloquea los chats marcados por el límite de tokens.
+
+    El contexto enviado al LLM está acotado por la ventana de conversación,
+    así que estos chats pueden seguir usándose.
+    """
+    unlocked = db.query(Chat).filter(Chat.token_limit_reached.is_(True)).update(
+        {Chat.token_limit_reached: False}, synchronize_session=False)
+    if unlocked:
+        db.commit()
+        print(f"Unlocked {unlocked} token limited chats")
+    return unlocked
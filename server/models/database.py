@@ -1,10 +1,14 @@
-from sqlalchemy import Boolean, create_engine, Column, String, JSON, ForeignKey, DateTime
+from sqlalchemy import Boolean, create_engine, Column, Index, Integer, String, JSON, ForeignKey, DateTime, Text, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
 import os
+import anyio
 from dotenv import load_dotenv
 from sqlalchemy.sql import func
 
+from utils.message_codec import dumps, loads
+
 load_dotenv()
 
 # Obtener URL de la base de datos desde variable de entorno
@@ -14,16 +18,89 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///sessions.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Crear engine sin el parámetro específico de SQLite
-engine = create_engine(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Pool de conexiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Segundos tras los que se recicla una conexión (evita conexiones cortadas por el servidor)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_SQLITE_WAL = os.getenv("DB_SQLITE_WAL", "true").lower() == "true"
+# Motor asíncrono (asyncpg / aiosqlite) para los endpoints que lo usan
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+
+def engine_options() -> dict:
+    # Columnas JSON (estado del agente) codificadas con orjson
+    json_options = {"json_serializer": dumps, "json_deserializer": loads}
+    if ":memory:" in DATABASE_URL:
+        # SQLite en memoria usa una única conexión por hilo, sin pool configurable
+        return {"connect_args": {"check_same_thread": False}, **json_options}
+
+    options = {
+        **json_options,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if IS_SQLITE:
+        # Las sesiones se usan desde hilos del pool distintos al que abrió la conexión
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def enable_sqlite_wal(sync_engine) -> None:
+    """Activa WAL en cada conexión SQLite para que las lecturas no esperen a las escrituras."""
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+
+def async_database_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+engine = create_engine(DATABASE_URL, **engine_options())
+if IS_SQLITE and DB_SQLITE_WAL and ":memory:" not in DATABASE_URL:
+    enable_sqlite_wal(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        options = engine_options()
+        options.pop("connect_args", None)
+        async_engine = create_async_engine(async_database_url(DATABASE_URL), **options)
+        if IS_SQLITE and DB_SQLITE_WAL and ":memory:" not in DATABASE_URL:
+            enable_sqlite_wal(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine, autocommit=False, autoflush=False, expire_on_commit=False)
+        print(f"Async database engine enabled ({async_engine.url.drivername})")
+    except ImportError as e:
+        # Sin asyncpg/aiosqlite instalado se sigue usando el motor síncrono en hilos
+        print(f"Async database driver not available, using sync engine: {e}")
+
 Base = declarative_base()
 
 class UserSession(Base):
     __tablename__ = "user_sessions"
     user_id = Column(String, primary_key=True)
-    # No longer stores session_data directly
+    # Estado del agente de la ruta antigua (/messages); los chats guardan el suyo en Chat.chat_state
+    session_data = Column(JSON, nullable=True)
 
 class Chat(Base):
     __tablename__ = "chats"
@@ -32,7 +109,65 @@ class Chat(Base):
     title = Column(String, nullable=False)
     created_at = Column(DateTime, default=func.now())
     token_limit_reached = Column(Boolean, default=False)
+    # Resumen para el listado de chats, actualizado al añadir mensajes
+    preview_text = Column(String, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=func.now())
+    # Formato antiguo: lista completa de mensajes. Los mensajes nuevos van a chat_messages
     messages = Column(JSON)
+    # Estado del agente (intención, etapa, información extraída) entre mensajes
+    chat_state = Column(JSON, nullable=True)
+
+    __table_args__ = (
+        # Listado de chats de un usuario ordenado por última actividad
+        Index("ix_chats_user_id_updated_at", "user_id", "updated_at", "id"),
+    )
+
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(String, ForeignKey("chats.id"), nullable=False)
+    # Posición del mensaje dentro del chat (0, 1, 2...)
+    seq = Column(Integer, nullable=False)
+    type = Column(String, nullable=False)
+    content = Column(Text, nullable=False, default="")
+    tool_call_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ix_chat_messages_chat_id_seq", "chat_id", "seq", unique=True),
+    )
+
+
+def add_missing_columns():
+    """Añade a las tablas existentes las columnas e índices nuevos de los modelos.
+
+    create_all solo crea tablas que no existen, así que las columnas añadidas
+    después se crean aquí con ALTER TABLE.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = ""
+                if column.server_default is not None:
+                    default = f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+                print(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    print(f"Added index {index.name}")
 
 
 def get_db():
@@ -40,4 +175,31 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@contextmanager
+def session_scope():
+    """Sesión de base de datos para código que se ejecuta fuera de las dependencias de FastAPI."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def run_db(func, *args):
+    """Ejecuta func(db, *args) sin bloquear el event loop.
+
+    Con el motor asíncrono la función recibe la sesión síncrona de
+    AsyncSession.run_sync; si no, se ejecuta en un hilo con una sesión normal.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(func, *args)
+
+    def run_in_session():
+        with session_scope() as db:
+            return func(db, *args)
+
+    return await anyio.to_thread.run_sync(run_in_session)
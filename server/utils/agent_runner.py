@@ -0,0 +1,70 @@
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Callable, Dict
+
+import anyio
+
+
+class AgentRunner:
+    """Ejecuta el trabajo bloqueante del agente (LLM y base de datos) fuera del event loop.
+
+    Como mucho ``max_concurrency`` peticiones se procesan a la vez en un pool
+    de hilos propio; el resto espera en cola sin bloquear el resto de endpoints.
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max_concurrency
+        self._slots = anyio.Semaphore(max_concurrency)
+        self._threads = anyio.CapacityLimiter(max_concurrency)
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Reserva una de las plazas de ejecución, esperando en cola si no hay ninguna libre."""
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self._total_wait += started_at - queued_at
+        self.in_flight += 1
+        try:
+            yield
+            self.completed += 1
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._total_run += time.perf_counter() - started_at
+            self._slots.release()
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta una función bloqueante en el pool y devuelve su resultado."""
+        async with self.slot():
+            return await anyio.to_thread.run_sync(
+                partial(func, *args, **kwargs), limiter=self._threads)
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._total_wait / finished * 1000, 2) if finished else 0.0,
+            "avg_run_ms": round(self._total_run / finished * 1000, 2) if finished else 0.0,
+        }
@@ -0,0 +1,141 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+import orjson
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, ToolMessage
+
+DEFAULT_TOOL_CALL_ID = "default_tool_call_id"
+
+
+def _json_default(value: Any) -> Any:
+    # Igual que la serialización anterior: lo que no es JSON se guarda como texto
+    return str(value)
+
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(data: Any) -> str:
+    """JSON con orjson; los valores no serializables se convierten con str()."""
+    return orjson.dumps(data, default=_json_default, option=ORJSON_OPTIONS).decode()
+
+
+def loads(data: Any) -> Any:
+    return orjson.loads(data)
+
+
+def _base_fields(message: BaseMessage, message_type: str) -> Dict:
+    data = {"_message_type": message_type, "content": message.content}
+    if message.id:
+        data["id"] = message.id
+    if message.name:
+        data["name"] = message.name
+    if message.response_metadata:
+        data["response_metadata"] = message.response_metadata
+    return data
+
+
+def _encode_ai(message: AIMessage) -> Tuple[Dict, Dict]:
+    full = _base_fields(message, "AIMessage")
+    full["additional_kwargs"] = message.additional_kwargs
+    if message.tool_calls:
+        full["tool_calls"] = message.tool_calls
+    return full, {"type": "AI", "content": message.content}
+
+
+def _encode_human(message: HumanMessage) -> Tuple[Dict, Dict]:
+    return _base_fields(message, "HumanMessage"), {"type": "Human", "content": message.content}
+
+
+def _encode_tool(message: ToolMessage) -> Tuple[Dict, Dict]:
+    full = _base_fields(message, "ToolMessage")
+    full["tool_call_id"] = message.tool_call_id
+    return full, {
+        "type": "tool_result",
+        "content": message.content,
+        "tool_call_id": message.tool_call_id
+    }
+
+
+def _encode_system(message: SystemMessage) -> Tuple[Dict, Dict]:
+    # El frontend no muestra mensajes de sistema; se mantiene el formato anterior
+    return _base_fields(message, "SystemMessage"), {
+        "type": "tool_result",
+        "content": message.content,
+        "tool_call_id": DEFAULT_TOOL_CALL_ID
+    }
+
+
+# Codificador por clase de mensaje: devuelve (representación completa, representación frontend)
+ENCODERS: Dict[type, Callable[[Any], Tuple[Dict, Dict]]] = {
+    AIMessage: _encode_ai,
+    HumanMessage: _encode_human,
+    ToolMessage: _encode_tool,
+    SystemMessage: _encode_system,
+}
+
+
+def encode_message(message: Any) -> Tuple[Dict, Dict]:
+    """Codifica un mensaje en sus dos representaciones en una sola pasada."""
+    encoder = ENCODERS.get(type(message))
+    if encoder is None:
+        # Subclases u otros tipos: se busca el codificador de la clase base
+        for message_class, candidate in ENCODERS.items():
+            if isinstance(message, message_class):
+                encoder = candidate
+                break
+    if encoder is not None:
+        return encoder(message)
+
+    # Resultados de herramientas en forma de diccionario y otros casos
+    from utils.serializer import serialize_message_frontend
+    frontend = serialize_message_frontend(message)
+    return {"_message_type": type(message).__name__, **frontend}, frontend
+
+
+def encode_messages(messages: List[Any]) -> Tuple[List[Dict], List[Dict]]:
+    full_messages, frontend_messages = [], []
+    for message in messages:
+        full, frontend = encode_message(message)
+        full_messages.append(full)
+        frontend_messages.append(frontend)
+    return full_messages, frontend_messages
+
+
+def _optional_fields(data: Dict) -> Dict:
+    return {key: data[key] for key in ("id", "name", "response_metadata") if data.get(key)}
+
+
+def _decode_ai(data: Dict) -> AIMessage:
+    return AIMessage(
+        content=data.get("content", ""),
+        additional_kwargs=data.get("additional_kwargs", {}),
+        tool_calls=data.get("tool_calls", []),
+        **_optional_fields(data)
+    )
+
+
+def _decode_human(data: Dict) -> HumanMessage:
+    return HumanMessage(content=data.get("content", ""), **_optional_fields(data))
+
+
+def _decode_tool(data: Dict) -> ToolMessage:
+    return ToolMessage(
+        content=data.get("content", ""),
+        tool_call_id=data.get("tool_call_id", DEFAULT_TOOL_CALL_ID),
+        **_optional_fields(data)
+    )
+
+
+def _decode_system(data: Dict) -> SystemMessage:
+    return SystemMessage(content=data.get("content", ""), **_optional_fields(data))
+
+
+# Decodificador por tipo de mensaje (campo _message_type de la representación completa)
+DECODERS: Dict[str, Callable[[Dict], BaseMessage]] = {
+    "AIMessage": _decode_ai,
+    "HumanMessage": _decode_human,
+    "ToolMessage": _decode_tool,
+    "SystemMessage": _decode_system,
+}
+
@@ -1,56 +1,30 @@
 from typing import Any, Dict, List, Optional
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.messages import ToolMessage, BaseMessage
 from agent.models import DeviceInfo, BuyingInfo
+from utils.message_codec import DECODERS, encode_message, encode_messages
 from datetime import date
-import json
-import uuid
+import copy
+
+# Claves del estado del agente que se conservan entre mensajes de un chat
+CHAT_STATE_KEYS = ("stage", "intent", "device_info", "buying_info",
+                   "device_info_until", "buying_info_until",
+                   "conversation_summary", "summary_until")
+# Cursores de extracción y del resumen: posiciones dentro de la lista de mensajes
+CHAT_STATE_CURSORS = ("device_info_until", "buying_info_until", "summary_until")
 
 def serialize_model(model: Any) -> Dict:
     """Serializa modelos Pydantic"""
     if isinstance(model, (DeviceInfo, BuyingInfo)):
-        data = model.dict()
-        # Convertir fecha a string si existe
-        if isinstance(data.get('release_date'), date):
-            data['release_date'] = data['release_date'].isoformat()
-        return data
+        # mode="json" ya convierte la fecha a string ISO
+        return model.model_dump(mode="json")
     if isinstance(model, date):
         return model.isoformat()
     return str(model)
 
 def serialize_message_full(message: Any) -> Dict:
     """Serializa completamente un mensaje para preservar su estructura interna"""
-    # Guardar el tipo de mensaje
-    message_type = type(message).__name__
-    
-    data = {
-        "_message_type": message_type,
-    }
-    
-    # Guardar contenido
-    if hasattr(message, "content"):
-        data["content"] = message.content
-    
-    # Guardar additional_kwargs para AIMessage
-    if isinstance(message, AIMessage) and hasattr(message, "additional_kwargs"):
-        data["additional_kwargs"] = message.additional_kwargs
-    
-    # Guardar tool_call_id para ToolMessage
-    if isinstance(message, ToolMessage) and hasattr(message, "tool_call_id"):
-        data["tool_call_id"] = message.tool_call_id
-    
-    # Para otros atributos específicos de cada tipo de mensaje
-    if hasattr(message, "__dict__"):
-        for key, value in message.__dict__.items():
-            if key not in ["content", "additional_kwargs", "tool_call_id"] and not key.startswith("_"):
-                try:
-                    # Intentar serializar, si falla usar str()
-                    json.dumps(value)
-                    data[key] = value
-                except (TypeError, OverflowError):
-                    data[key] = str(value)
-    
-    return data
+    return encode_message(message)[0]
 
 def serialize_message_frontend(message: Any) -> Dict:
     """Convierte un mensaje de Langchain en un diccionario serializable para el frontend."""
@@ -92,20 +66,37 @@ def serialize_message_frontend(message: Any) -> Dict:
         "tool_call_id": "default_tool_call_id"
     }
 
+# Tipo de mensaje serializado -> tipo que usa el frontend
+FRONTEND_TYPES = {
+    "AIMessage": "AI",
+    "HumanMessage": "Human",
+    "ToolMessage": "tool_result",
+}
+
+def serialized_message_frontend(message_dict: Dict) -> Dict:
+    """Formato frontend de un mensaje ya serializado, sin reconstruir el mensaje de Langchain."""
+    message_type = message_dict.get("_message_type")
+    if message_type is None:
+        # Formato antiguo: ya está en formato frontend
+        return message_dict
+
+    frontend_type = FRONTEND_TYPES.get(message_type, "tool_result")
+    data = {
+        "type": frontend_type,
+        "content": message_dict.get("content", "")
+    }
+    if frontend_type == "tool_result":
+        data["tool_call_id"] = message_dict.get("tool_call_id", "default_tool_call_id")
+    return data
+
 def serialize_state(state: Dict) -> Dict:
     """Serializa el estado completo del agente."""
     serialized_state = state.copy()
     
     if "messages" in serialized_state:
-        # Serializar cada mensaje con estructura completa para preservar su estado interno
-        serialized_state["messages"] = [
-            serialize_message_full(msg) for msg in serialized_state["messages"]
-        ]
-        
-        # También guardar una versión simplificada para el frontend
-        serialized_state["frontend_messages"] = [
-            serialize_message_frontend(msg) for msg in state["messages"]
-        ]
+        # Estructura completa y versión simplificada para el frontend en una sola pasada
+        serialized_state["messages"], serialized_state["frontend_messages"] = encode_messages(
+            serialized_state["messages"])
     
     if "device_info" in serialized_state:
         serialized_state["device_info"] = serialize_model(serialized_state["device_info"])
@@ -118,24 +109,9 @@ def serialize_state(state: Dict) -> Dict:
 def deserialize_message(message_dict: Dict) -> BaseMessage:
     """Reconstruye un mensaje de Langchain desde su representación serializada."""
     # Si es una serialización completa (tiene _message_type)
-    if "_message_type" in message_dict:
-        message_type = message_dict["_message_type"]
-        
-        if message_type == "AIMessage":
-            # Reconstruir AIMessage con additional_kwargs si existe
-            additional_kwargs = message_dict.get("additional_kwargs", {})
-            return AIMessage(content=message_dict.get("content", ""), additional_kwargs=additional_kwargs)
-        
-        elif message_type == "HumanMessage":
-            return HumanMessage(content=message_dict.get("content", ""))
-        
-        elif message_type == "ToolMessage":
-            # Reconstruir ToolMessage con tool_call_id
-            tool_call_id = message_dict.get("tool_call_id", "default_tool_call_id")
-            return ToolMessage(content=message_dict.get("content", ""), tool_call_id=tool_call_id)
-        
-        elif message_type == "SystemMessage":
-            return SystemMessage(content=message_dict.get("content", ""))
+    decoder = DECODERS.get(message_dict.get("_message_type"))
+    if decoder is not None:
+        return decoder(message_dict)
     
     # Fallback para formatos antiguos
     if "type" in message_dict:
@@ -182,6 +158,32 @@ def get_frontend_messages(state: Dict) -> List[Dict]:
     
     # Si no hay frontend_messages, convertir los mensajes normales
     if "messages" in state:
-        return [serialize_message_frontend(msg) for msg in state["messages"]]
+        return [
+            serialized_message_frontend(msg) if isinstance(msg, dict) else serialize_message_frontend(msg)
+            for msg in state["messages"]
+        ]
     
-    return []
\ No newline at end of file
+    return []
+
+def serialize_chat_state(state: Dict) -> Dict:
+    """Serializa el estado del agente que se guarda con el chat, sin los mensajes.
+
+    Los cursores de extracción se convierten en posiciones dentro del historial
+    que se reconstruye en el siguiente turno, que solo contiene mensajes AI y Human.
+    """
+    chat_state = serialize_state({
+        key: state[key] for key in CHAT_STATE_KEYS if state.get(key) is not None
+    })
+
+    for key in CHAT_STATE_CURSORS:
+        if key in chat_state:
+            chat_state[key] = sum(
+                1 for msg in state["messages"][:chat_state[key]]
+                if isinstance(msg, (AIMessage, HumanMessage))
+            )
+
+    return chat_state
+
+def deserialize_chat_state(chat_state: Dict) -> Dict:
+    """Reconstruye el estado del agente guardado con el chat."""
+    return deserialize_state(copy.deepcopy(chat_state))
@@ -0,0 +1,102 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.database import UserSession
+from utils.serializer import deserialize_state, get_frontend_messages, serialize_state
+
+
+class SessionStateStore:
+    """Caché LRU del estado del agente por sesión, con escritura directa en la base de datos.
+
+    Cada entrada guarda el estado deserializado y su representación
+    serializada, de modo que los mensajes para el frontend se sirven sin
+    reconstruir los mensajes de LangChain. get devuelve una copia del estado
+    para que quien lo modifique no altere la entrada cacheada.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # session_id -> (estado deserializado, estado serializado)
+        self._entries: "OrderedDict[str, Tuple[Dict, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, session_id: str, state: Dict, serialized: Dict) -> None:
+        with self._lock:
+            self._entries[session_id] = (state, serialized)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _cached(self, session_id: str) -> Optional[Tuple[Dict, Dict]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _load_serialized(self, db: Session, session_id: str) -> Optional[Dict]:
+        session = db.query(UserSession).filter(
+            UserSession.user_id == session_id).first()
+        if session is None:
+            return None
+        return session.session_data or {}
+
+    def get(self, db: Session, session_id: str) -> Optional[Dict]:
+        """Estado deserializado de la sesión, o None si la sesión no existe."""
+        entry = self._cached(session_id)
+        if entry is not None:
+            return copy.deepcopy(entry[0])
+
+        serialized = self._load_serialized(db, session_id)
+        if serialized is None:
+            return None
+        # deserialize_state modifica los diccionarios anidados (fechas)
+        state = deserialize_state(copy.deepcopy(serialized))
+        self._remember(session_id, state, serialized)
+        return copy.deepcopy(state)
+
+    def get_frontend_messages(self, db: Session, session_id: str) -> Optional[List[Dict]]:
+        """Mensajes en formato frontend leídos de la representación serializada."""
+        entry = self._cached(session_id)
+        if entry is not None:
+            return get_frontend_messages(entry[1])
+
+        serialized = self._load_serialized(db, session_id)
+        if serialized is None:
+            return None
+        return get_frontend_messages(serialized)
+
+    def save(self, db: Session, session_id: str, state: Dict) -> None:
+        """Guarda el estado en la base de datos (creando la sesión si hace falta) y en la caché."""
+        # Los campos vacíos (p. ej. buying_info=None) no se guardan
+        state = copy.deepcopy({key: value for key, value in state.items() if value is not None})
+        serialized = serialize_state(state)
+        session = db.query(UserSession).filter(
+            UserSession.user_id == session_id).first()
+        if session is None:
+            db.add(UserSession(user_id=session_id, session_data=serialized))
+        else:
+            session.session_data = serialized
+        db.commit()
+        self._remember(session_id, state, serialized)
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
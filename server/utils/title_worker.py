@@ -0,0 +1,94 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Set
+
+# Palabras de relleno que no aportan al título heurístico
+FILLER_WORDS = {"hola", "buenas", "buenos", "días", "tardes", "noches", "por", "favor", "gracias"}
+# Palabras con las que no debe terminar el título
+TRAILING_WORDS = {"de", "del", "la", "el", "los", "las", "un", "una", "y", "o", "a", "en", "con", "para", "mi", "que"}
+MAX_TITLE_WORDS = 6
+MAX_TITLE_LENGTH = 50
+
+
+def heuristic_title(message: str) -> str:
+    """Título inmediato a partir del primer mensaje, sin llamar al LLM."""
+    words = [word for word in re.findall(r"[\wáéíóúüñÁÉÍÓÚÜÑ]+", message)
+             if word.lower() not in FILLER_WORDS]
+    if not words:
+        return "Nueva conversación"
+
+    words = words[:MAX_TITLE_WORDS]
+    while len(words) > 1 and words[-1].lower() in TRAILING_WORDS:
+        words.pop()
+
+    title = " ".join(words)
+    title = title[0].upper() + title[1:]
+    if len(title) > MAX_TITLE_LENGTH:
+        title = title[:MAX_TITLE_LENGTH - 3] + "..."
+    return title
+
+
+class TitleWorker:
+    """Genera los títulos de los chats en hilos de fondo, con reintentos.
+
+    generate(message) produce el título y on_title(chat_id, title, placeholder)
+    lo guarda; placeholder es el título heurístico asignado al chat mientras tanto.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], str],
+        on_title: Callable[[str, str, str], Any],
+        max_workers: int = 2,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+    ):
+        self.generate = generate
+        self.on_title = on_title
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="title-worker")
+        self._lock = threading.Lock()
+        self.pending: Set[str] = set()
+        self.generated = 0
+        self.failed = 0
+        self.retries = 0
+
+    def submit(self, chat_id: str, message: str, placeholder: str) -> None:
+        with self._lock:
+            self.pending.add(chat_id)
+        self._pool.submit(self._run, chat_id, message, placeholder)
+
+    def is_pending(self, chat_id: str) -> bool:
+        return chat_id in self.pending
+
+    def _run(self, chat_id: str, message: str, placeholder: str) -> None:
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    title = self.generate(message)
+                    self.on_title(chat_id, title, placeholder)
+                    self.generated += 1
+                    print(f"Generated new title for chat {chat_id}: '{title}'")
+                    return
+                except Exception as e:
+                    print(f"Error generating title for chat {chat_id} (attempt {attempt}): {str(e)}")
+                    if attempt < self.max_attempts:
+                        self.retries += 1
+                        # Espera creciente entre intentos
+                        time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            # Sin título del LLM el chat conserva el heurístico
+            self.failed += 1
+        finally:
+            with self._lock:
+                self.pending.discard(chat_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self.pending),
+            "generated": self.generated,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
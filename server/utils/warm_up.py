@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class WarmUp:
+    """Ejecuta en un hilo de fondo los pasos de carga pesados del servidor.
+
+    Cada paso es (nombre, función). Un paso que falla no detiene los
+    siguientes: lo que no se haya cargado se cargará en el primer uso.
+    """
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        self.steps = steps
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.state = "pending"
+        self.durations_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        self.state = "running"
+        started_at = time.perf_counter()
+        for name, step in self.steps:
+            step_started_at = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                print(f"Error during warm-up step {name}: {e}")
+                self.errors[name] = str(e)
+            self.durations_ms[name] = round((time.perf_counter() - step_started_at) * 1000, 1)
+        self.state = "failed" if self.errors else "ready"
+        self._done.set()
+        print(f"Warm-up finished in {(time.perf_counter() - started_at):.1f} s: {self.durations_ms}")
+
+    @property
+    def ready(self) -> bool:
+        """True solo si todos los pasos han terminado sin errores."""
+        return self.state == "ready"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que termine el warm-up (lo arranca si no se había hecho)."""
+        self.start()
+        return self._done.wait(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "durations_ms": dict(self.durations_ms),
+            "errors": dict(self.errors),
+        }